@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+from typing import Optional
+
+from archive_reader import ArchiveReader, file_time_range
+
+# Where the sidecar index files live; CHRONOAI_INDEX_DIR overrides it
+INDEX_DIR = os.getenv("CHRONOAI_INDEX_DIR", os.path.expanduser("~/.cache/chronoai/archive_index"))
+INDEX_VERSION = 1
+
+
+class ArchiveIndex:
+    """
+    Persistent sidecar index for one chronicle/story: for every archive
+    file it records the first and last event timestamp and the event count,
+    so range queries only open files that overlap the range.
+
+    `refresh` re-reads only files that are new or changed since the last
+    refresh (by size and mtime) and forgets files that have disappeared.
+    """
+
+    def __init__(self, reader: ArchiveReader, chronicle: str, story: str, index_dir: str = INDEX_DIR):
+        self.reader = reader
+        self.chronicle = chronicle
+        self.story = story
+        self.path = os.path.join(index_dir, f"{chronicle}.{story}.index.json")
+        self._lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get("story_files_dir") != self.reader.story_files_dir:
+            return {}
+        return data.get("files", {})
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "story_files_dir": self.reader.story_files_dir,
+                "chronicle": self.chronicle,
+                "story": self.story,
+                "files": self.entries,
+            }, f)
+        os.replace(tmp, self.path)
+
+    def refresh(self) -> int:
+        """
+        Bring the index up to date with the archive directory.
+
+        Returns:
+            int: Number of files that were (re)indexed.
+        """
+        with self._lock:
+            seen = set()
+            updated = 0
+            for file_start, path in self.reader.story_files(self.chronicle, self.story):
+                name = os.path.basename(path)
+                seen.add(name)
+                st = os.stat(path)
+                entry = self.entries.get(name)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                    continue
+                first, last, count = file_time_range(path)
+                self.entries[name] = {
+                    "file_start": file_start,
+                    "start": first,
+                    "end": last,
+                    "count": count,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                }
+                updated += 1
+            removed = [name for name in self.entries if name not in seen]
+            for name in removed:
+                del self.entries[name]
+            if updated or removed:
+                self._save()
+            return updated
+
+    def files_in_range(self, start_time: int = 0, end_time: Optional[int] = None) -> list[str]:
+        """Files whose [start, end] overlaps [start_time, end_time], oldest first."""
+        selected = []
+        with self._lock:
+            for name, entry in self.entries.items():
+                if not entry["count"]:
+                    continue
+                if entry["end"] < start_time or (end_time is not None and entry["start"] > end_time):
+                    continue
+                selected.append((entry["start"], os.path.join(self.reader.story_files_dir, name)))
+        selected.sort()
+        return [path for _, path in selected]
+
+    def event_count(self, start_time: int = 0, end_time: Optional[int] = None) -> int:
+        """Upper bound on the events in range, from the per-file counts."""
+        with self._lock:
+            return sum(
+                entry["count"] for entry in self.entries.values()
+                if entry["count"] and entry["end"] >= start_time
+                and (end_time is None or entry["start"] <= end_time)
+            )
+
+
+class IndexedArchiveReader(ArchiveReader):
+    """
+    ArchiveReader that consults (and incrementally refreshes) an
+    ArchiveIndex per story before opening any archive file.
+    """
+
+    def __init__(self, story_files_dir: str, index_dir: str = INDEX_DIR):
+        super().__init__(story_files_dir)
+        self.index_dir = index_dir
+        self._indexes = {}
+        # The daemon shares one reader between its request threads
+        self._indexes_lock = threading.Lock()
+
+    def index(self, chronicle: str, story: str) -> ArchiveIndex:
+        key = (chronicle, story)
+        with self._indexes_lock:
+            if key not in self._indexes:
+                self._indexes[key] = ArchiveIndex(self, chronicle, story, self.index_dir)
+            return self._indexes[key]
+
+    def files_in_range(self, chronicle: str, story: str, start_time: int = 0,
+                       end_time: Optional[int] = None) -> list[str]:
+        index = self.index(chronicle, story)
+        index.refresh()
+        return index.files_in_range(start_time, end_time)
@@ -0,0 +1,187 @@
+import json
+import os
+from typing import Iterator, Optional
+
+import h5py
+import numpy as np
+from event_fragments import reassemble
+from wal_spool import unwrap_spooled
+
+# Layout written by ChronoLog's story chunk archiver (see HDF5ArchiveReadingAgent.h):
+#   <story_files_dir>/<chronicle>.<story>.<start time in seconds>.vlen.h5
+# holding one compound dataset of events.
+ARCHIVE_SUFFIX = ".vlen.h5"
+DATASET_NAME = "/story_chunks/data.vlen_bytes"
+EVENT_TIME = "eventTime"
+CLIENT_ID = "clientId"
+EVENT_INDEX = "eventIndex"
+LOG_RECORD = "logRecord"
+
+NS_PER_SECOND = 1_000_000_000
+
+
+def story_files_dir_from_config(config_file: str) -> str:
+    """
+    Return the grapher's `story_files_dir` from a ChronoLog JSON config.
+    """
+    with open(config_file) as f:
+        conf = json.load(f)
+
+    def find(node):
+        if isinstance(node, dict):
+            if "story_files_dir" in node:
+                return node["story_files_dir"]
+            for value in node.values():
+                found = find(value)
+                if found is not None:
+                    return found
+        return None
+
+    story_files_dir = find(conf)
+    if story_files_dir is None:
+        raise KeyError(f"No story_files_dir in {config_file}")
+    return story_files_dir
+
+
+def parse_archive_name(file_name: str) -> Optional[tuple[str, str, int]]:
+    """
+    Split an archive file name into (chronicle, story, start_time_ns), or
+    None if it is not a story chunk file.
+    """
+    base_name = os.path.basename(file_name)
+    if not base_name.endswith(ARCHIVE_SUFFIX):
+        return None
+    parts = base_name[: -len(ARCHIVE_SUFFIX)].split(".")
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    start = int(parts[2])
+    # File names carry seconds; accept nanoseconds too
+    if start < 10 ** 12:
+        start *= NS_PER_SECOND
+    return parts[0], parts[1], start
+
+
+def _find_event_dataset(h5file):
+    if DATASET_NAME in h5file:
+        return h5file[DATASET_NAME]
+    found = []
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.dtype.names and EVENT_TIME in obj.dtype.names:
+            found.append(obj)
+
+    h5file.visititems(visit)
+    return found[0] if found else None
+
+
+def _record_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return np.asarray(value, dtype=np.uint8).tobytes()
+
+
+def file_time_range(path: str) -> tuple[Optional[int], Optional[int], int]:
+    """
+    Return (first_timestamp, last_timestamp, event_count) for one archive
+    file, reading only the eventTime column.
+    """
+    with h5py.File(path, "r") as h5file:
+        dataset = _find_event_dataset(h5file)
+        if dataset is None or dataset.shape[0] == 0:
+            return None, None, 0
+        times = dataset.fields(EVENT_TIME)[:]
+        return int(times.min()), int(times.max()), int(times.shape[0])
+
+
+def read_archive_file(path: str, start_time: int = 0, end_time: Optional[int] = None
+                      ) -> Iterator[tuple[int, int, int, bytes]]:
+    """
+    Yield (timestamp, client_id, index, record) for events in one archive
+    file with start_time <= timestamp <= end_time, in event order.
+    """
+    with h5py.File(path, "r") as h5file:
+        dataset = _find_event_dataset(h5file)
+        if dataset is None or dataset.shape[0] == 0:
+            return
+        times = dataset.fields(EVENT_TIME)[:]
+        mask = times >= start_time
+        if end_time is not None:
+            mask &= times <= end_time
+        if not mask.any():
+            return
+        events = dataset[:] if mask.all() else dataset[np.flatnonzero(mask)]
+        order = np.lexsort((events[EVENT_INDEX], events[CLIENT_ID], events[EVENT_TIME]))
+        for i in order:
+            event = events[i]
+            yield (
+                int(event[EVENT_TIME]),
+                int(event[CLIENT_ID]),
+                int(event[EVENT_INDEX]),
+                _record_bytes(event[LOG_RECORD]),
+            )
+
+
+class ArchiveReader:
+    """
+    Reads archived story chunks straight from the grapher's story files
+    directory, without going through the C++ reader binary.
+    """
+
+    def __init__(self, story_files_dir: str):
+        self.story_files_dir = story_files_dir
+
+    def story_files(self, chronicle: str, story: str) -> list[tuple[int, str]]:
+        """Archive files for one story as (start_time_ns, path), oldest first."""
+        files = []
+        for entry in os.scandir(self.story_files_dir):
+            parsed = parse_archive_name(entry.name)
+            if parsed and parsed[0] == chronicle and parsed[1] == story:
+                files.append((parsed[2], entry.path))
+        files.sort()
+        return files
+
+    def files_in_range(self, chronicle: str, story: str, start_time: int = 0,
+                       end_time: Optional[int] = None) -> list[str]:
+        """
+        Archive files that may hold events in [start_time, end_time]. A file's
+        events end before the next file's start second is over, which bounds
+        it from above.
+        """
+        files = self.story_files(chronicle, story)
+        selected = []
+        for i, (file_start, path) in enumerate(files):
+            if end_time is not None and file_start > end_time:
+                break
+            if i + 1 < len(files) and files[i + 1][0] + NS_PER_SECOND <= start_time:
+                continue
+            selected.append(path)
+        return selected
+
+    def _scan(self, chronicle, story, start_time, end_time):
+        for path in self.files_in_range(chronicle, story, start_time, end_time):
+            yield from read_archive_file(path, start_time, end_time)
+
+    def read_story(self, chronicle: str, story: str, start_time: int = 0,
+                   end_time: Optional[int] = None, incomplete: Optional[list] = None,
+                   unwrap: bool = True) -> Iterator[tuple[int, int, int, bytes]]:
+        """
+        Yield (timestamp, client_id, index, record) for every archived event
+        of the story within [start_time, end_time], oldest first. Fragmented
+        events are yielded once, reassembled, under their first fragment's
+        timestamp (reading past `end_time` if their last fragments are
+        there); events replayed from a spool are unwrapped and yielded
+        once, under the timestamp ChronoLog gave them.
+
+        `incomplete` receives the timestamps of fragmented events whose last
+        fragments have not been archived yet (see event_fragments.reassemble).
+        With `unwrap` False, replayed events are yielded as logged, envelope
+        and duplicates included (see wal_spool.parse_spooled).
+        """
+        records = reassemble(
+            self._scan(chronicle, story, start_time, end_time),
+            more=lambda after: self._scan(chronicle, story, after, None),
+            incomplete=incomplete,
+        )
+        yield from unwrap_spooled(records) if unwrap else records
@@ -1,33 +1,14 @@
 import os
+import json
 import time
-import openai
-import py_chronolog_client
+from chronolog_session import get_session
+from log_writer import get_writer
+from external_llm import chat_with_gpt
+from event_codec import encode_event
+from instrumentation import get_metrics
 
-# Set your OpenAI API key from environment variable
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-def chat_with_gpt(prompt, model="gpt-3.5-turbo", temperature=0.7):
-    """
-    Sends a prompt to the ChatGPT API and returns the response.
-    
-    Args:
-        prompt (str): The user's prompt.
-        model (str): The model name (default: "gpt-3.5-turbo").
-        temperature (float): Controls randomness (default: 0.7).
-        
-    Returns:
-        str: The response text from ChatGPT.
-    """
-    try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        return response.choices[0].message['content'].strip()
-    except Exception as e:
-        print(f"Error in chat_with_gpt: {e}")
-        return None
+# Read by graph_externalllm.py
+RESULTS_FILE = "results/external_benchmark.json"
 
 def benchmark_without_logging(num_requests=100):
     """
@@ -37,7 +18,7 @@ def benchmark_without_logging(num_requests=100):
     start_time = time.perf_counter()
     for i in range(1, num_requests + 1):
         prompt = f"Test prompt {i}: Tell me something interesting about the number {i}."
-        response = chat_with_gpt(prompt)
+        response = chat_with_gpt(prompt, use_cache=False)
         if response is None:
             response = "No response"
         print(f"Request {i} completed.")
@@ -52,41 +33,40 @@ def benchmark_with_logging(num_requests=100):
     """
     print("Benchmarking with ChronoLog logging...")
     
-    # Setup ChronoLog client
-    clientConf = py_chronolog_client.ClientPortalServiceConf("ofi+sockets", "127.0.0.1", 5555, 55)
-    client = py_chronolog_client.Client(clientConf)
-    
-    connect_code = client.Connect()
-    print("client.Connect() returns:", connect_code)
-    
-    attrs = dict()
-    create_code = client.CreateChronicle("py_chronicle_101", attrs, 1)
-    print("client.CreateChronicle() returns:", create_code)
-    
-    ret_tuple = client.AcquireStory("py_chronicle_101", "benchmark_story_101", attrs, 1)
-    if ret_tuple[0] != 0:
-        print("Failed to acquire story for logging.")
+    # Setup ChronoLog session and background writer
+    session = get_session()
+    try:
+        session.get_story("py_chronicle_101", "benchmark_story_101")
+    except RuntimeError as e:
+        print(f"Failed to acquire story for logging ({e}).")
         return None, None
-    story = ret_tuple[1]
+    writer = get_writer()
 
     start_time = time.perf_counter()
     for i in range(1, num_requests + 1):
         prompt = f"Test prompt {i}: Tell me something interesting about the number {i}."
-        response = chat_with_gpt(prompt)
+        stats = {}
+        response = chat_with_gpt(prompt, stats=stats, use_cache=False)
         if response is None:
             response = "No response"
-        log_message = f"Prompt: {prompt}\nResponse: {response}"
-        story.log_event(log_message)
+        log_message = encode_event(
+            prompt, response,
+            model="gpt-3.5-turbo",
+            temperature=0.7,
+            latency=stats.get("latency"),
+            prompt_tokens=stats.get("prompt_tokens"),
+            completion_tokens=stats.get("completion_tokens"),
+        )
+        writer.submit("py_chronicle_101", "benchmark_story_101", log_message)
         print(f"Request {i} and logging completed.")
+    # Wait until every queued event has reached ChronoLog
+    writer.flush()
     end_time = time.perf_counter()
     total_time = end_time - start_time
     avg_time = total_time / num_requests
 
-    release_code = client.ReleaseStory("py_chronicle_101", "benchmark_story_101")
-    print("client.ReleaseStory() returns:", release_code)
-    
-    disconnect_code = client.Disconnect()
-    print("client.Disconnect() returns:", disconnect_code)
+    writer.close()
+    session.release_story("py_chronicle_101", "benchmark_story_101")
 
     return total_time, avg_time
 
@@ -104,5 +84,23 @@ def main():
         print(f"\nBenchmark with logging: Total time = {total_with_log:.2f}s, "
               f"Average time per request = {avg_with_log:.2f}s")
 
+    print("\n--- Per-phase breakdown ---")
+    print(get_metrics().format_summary())
+
+    if total_with_log is None:
+        print(f"The logging run failed; {RESULTS_FILE} was not written.")
+        return
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "w") as f:
+        json.dump({
+            "benchmark": "external_llm",
+            "model": "gpt-3.5-turbo",
+            "iterations": num_requests,
+            "duration_without": total_no_log,
+            "duration_with": total_with_log,
+            "phases": get_metrics().snapshot(),
+        }, f, indent=2)
+    print(f"Results written to {RESULTS_FILE}")
+
 if __name__ == "__main__":
     main()
@@ -1,23 +1,18 @@
 import os
+import json
 import time
-import requests
-import py_chronolog_client
+from chronolog_session import get_session
+from log_writer import get_writer
+from internal_llm import prompt_ollama
+from event_codec import encode_event
+from instrumentation import get_metrics
 
-# --- Helper function to send prompt to Ollama server ---
-def prompt_ollama(model, prompt, server_url='http://localhost:11434'):
-    url = f'{server_url}/api/generate'
-    data = {
-        'model': model,
-        'prompt': prompt,
-        'stream': False
-    }
-    response = requests.post(url, json=data)
-    if response.status_code == 200:
-        result = response.json()
-        return result.get('response', '').strip()
-    else:
-        print(f"Request failed: {response.status_code}: {response.text}")
-        return None
+# --- Ollama helper shared with internal_llm.py ---
+# Set STREAM to True to read responses as NDJSON token streams. The prompt
+# cache is bypassed so every request pays real inference latency.
+STREAM = False
+# Read by graph_internalllm.py
+RESULTS_FILE = "results/internal_benchmark.json"
 
 # --- Benchmark without ChronoLog logging ---
 def benchmark_without_chronolog(n=100):
@@ -25,14 +20,12 @@ def benchmark_without_chronolog(n=100):
     start_time = time.time()
     for i in range(1, n + 1):
         prompt = f"Test prompt {i}: Tell me something interesting about the number {i} in short."
-        response = prompt_ollama("llama3.2", prompt)
+        response = prompt_ollama("llama3.2", prompt, stream=STREAM, use_cache=False)
         if response is None:
             response = "No response received due to an error."
         print(f"Request {i} completed.")
 
         # No logging is performed here
-        # Optionally, add a delay if necessary:
-        time.sleep(0.1)
     end_time = time.time()
     duration = end_time - start_time
     print(f"Benchmark without ChronoLog logging completed in {duration:.2f} seconds")
@@ -41,52 +34,46 @@ def benchmark_without_chronolog(n=100):
 # --- Setup ChronoLog Client ---
 def setup_chronolog():
     print("\nSetting up ChronoLog...")
-    clientConf = py_chronolog_client.ClientPortalServiceConf("ofi+sockets", "127.0.0.1", 5555, 55)
-    client = py_chronolog_client.Client(clientConf)
-    
-    ret = client.Connect()
-    print("client.Connect() returns:", ret)
-    
-    attrs = {}
-    ret = client.CreateChronicle("bench_chronicle_llama", attrs, 1)
-    print("client.CreateChronicle() returns:", ret)
-    
-    ret_tuple = client.AcquireStory("bench_chronicle_llama", "bench_story_llama", attrs, 1)
-    print("client.AcquireStory() returns:", ret_tuple)
-    
-    if ret_tuple[0] != 0:
-        print("Failed to acquire story. Exiting benchmark with logging.")
+    session = get_session()
+    try:
+        session.get_story("bench_chronicle_llama", "bench_story_llama")
+    except RuntimeError as e:
+        print(f"Failed to acquire story ({e}). Exiting benchmark with logging.")
         return None, None
-    story = ret_tuple[1]
-    return client, story
+    return session, get_writer()
 
 # --- Benchmark with ChronoLog logging ---
-def benchmark_with_chronolog(n=100, story=None):
+def benchmark_with_chronolog(n=100, writer=None):
     print("\n--- Benchmark: WITH ChronoLog Logging ---")
     start_time = time.time()
     for i in range(1, n + 1):
         prompt = f"Test prompt {i}: Tell me something interesting about the number {i} in short."
-        response = prompt_ollama("llama3.2", prompt)
+        stats = {}
+        response = prompt_ollama("llama3.2", prompt, stream=STREAM, stats=stats, use_cache=False)
         if response is None:
             response = "No response received due to an error."
-        # Combine prompt and response into one log message
-        log_message = f"Prompt: {prompt}\nResponse: {response}"
-        story.log_event(log_message)
+        # Log prompt, response and call metadata as one event
+        log_message = encode_event(
+            prompt, response,
+            model="llama3.2",
+            latency=stats.get("latency"),
+            prompt_tokens=stats.get("prompt_tokens"),
+            completion_tokens=stats.get("completion_tokens"),
+        )
+        writer.submit("bench_chronicle_llama", "bench_story_llama", log_message)
         print(f"Request {i} and logging completed.")
-
-        # Optionally, add a delay if necessary:
-        time.sleep(0.1)
+    # Wait until every queued event has reached ChronoLog
+    writer.flush()
     end_time = time.time()
     duration = end_time - start_time
     print(f"Benchmark with ChronoLog logging completed in {duration:.2f} seconds")
     return duration
 
 # --- Release ChronoLog Client ---
-def release_chronolog(client):
-    ret = client.ReleaseStory("bench_chronicle_llama", "bench_story_llama")
-    print("client.ReleaseStory() returns:", ret)
-    ret = client.Disconnect()
-    print("client.Disconnect() returns:", ret)
+def release_chronolog(session, writer):
+    writer.close()
+    print("Written events:", writer.written, "failed:", writer.failed)
+    session.close()
 
 # --- Main function to run benchmarks sequentially ---
 def main():
@@ -97,16 +84,16 @@ def main():
     duration_without = benchmark_without_chronolog(iterations)
     
     # Set up ChronoLog for the second benchmark
-    client, story = setup_chronolog()
-    if client is None or story is None:
+    session, writer = setup_chronolog()
+    if session is None or writer is None:
         print("Skipping benchmark with ChronoLog due to setup failure.")
         return
     
     # Run the benchmark with ChronoLog logging
-    duration_with = benchmark_with_chronolog(iterations, story)
+    duration_with = benchmark_with_chronolog(iterations, writer)
     
     # Release the ChronoLog resources as the last process
-    release_chronolog(client)
+    release_chronolog(session, writer)
     
     # Output the benchmark results
     print("\n--- Benchmark Results ---")
@@ -116,5 +103,21 @@ def main():
     overhead = duration_with - duration_without
     print(f"Logging overhead: {overhead:.2f} seconds over {iterations} iterations")
 
+    print("\n--- Per-phase breakdown ---")
+    print(get_metrics().format_summary())
+
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "w") as f:
+        json.dump({
+            "benchmark": "internal_llm",
+            "model": "llama3.2",
+            "stream": STREAM,
+            "iterations": iterations,
+            "duration_without": duration_without,
+            "duration_with": duration_with,
+            "phases": get_metrics().snapshot(),
+        }, f, indent=2)
+    print(f"Results written to {RESULTS_FILE}")
+
 if __name__ == "__main__":
     main()
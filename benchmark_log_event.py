@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import time
+
+from chronolog_session import get_session
+
+# Python counterpart of benchmarks/writebuffer{1kb,1mb,1gb}.cpp: drives
+# story.log_event on the raw binding handle, so neither the background
+# writer nor fragmentation is part of what is measured.
+
+SIZES = {
+    "1KB": 1 << 10,
+    "64KB": 64 << 10,
+    "1MB": 1 << 20,
+    "16MB": 16 << 20,
+    "256MB": 256 << 20,
+    "1GB": 1 << 30,
+}
+DEFAULT_SIZES = "1KB,64KB,1MB,16MB,256MB,1GB"
+WARMUP_EVENTS = 5
+TRIALS = 5
+# Each trial logs about this many bytes (at least one event, at most MAX_EVENTS)
+BYTES_PER_TRIAL = 64 << 20
+MAX_EVENTS = 10000
+RESULTS_FILE = "results/log_event_benchmark.json"
+
+# Two-sided 95% Student t critical values by degrees of freedom
+_T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+        9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042}
+
+
+def parse_size(text):
+    """Parse "1KB", "16MB", "1GB" or a plain byte count."""
+    text = text.strip().upper()
+    if text in SIZES:
+        return SIZES[text]
+    for suffix, shift in (("KB", 10), ("MB", 20), ("GB", 30)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * (1 << shift))
+    return int(text)
+
+
+def size_label(size):
+    for suffix, shift in (("GB", 30), ("MB", 20), ("KB", 10)):
+        if size >= 1 << shift and size % (1 << shift) == 0:
+            return f"{size >> shift}{suffix}"
+    return f"{size}B"
+
+
+def t95(df):
+    if df in _T95:
+        return _T95[df]
+    below = [d for d in _T95 if d < df]
+    return _T95[max(below)] if df <= 30 else 1.96
+
+
+def describe(values):
+    """Mean, standard deviation and 95% confidence half-width of `values`."""
+    n = len(values)
+    mean = statistics.fmean(values) if n else 0.0
+    stdev = statistics.stdev(values) if n > 1 else 0.0
+    # No interval from a single trial
+    ci95 = t95(n - 1) * stdev / math.sqrt(n) if n > 1 else None
+    return {"mean": mean, "stdev": stdev, "ci95": ci95, "min": min(values, default=0.0),
+            "max": max(values, default=0.0), "n": n}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def bench_size(story, size, trials=TRIALS, warmup=WARMUP_EVENTS,
+               bytes_per_trial=BYTES_PER_TRIAL, max_events=MAX_EVENTS):
+    """
+    Log `size`-byte payloads through `story.log_event`: a few warm-up events,
+    then `trials` timed runs of the same number of events each.
+    """
+    payload = "x" * size
+    events = max(1, min(max_events, bytes_per_trial // size))
+    for _ in range(min(warmup, events)):
+        story.log_event(payload)
+
+    trial_results, latencies = [], []
+    for trial in range(trials):
+        start = time.perf_counter()
+        for _ in range(events):
+            t0 = time.perf_counter()
+            story.log_event(payload)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        trial_results.append({
+            "elapsed_s": elapsed,
+            "events_per_s": events / elapsed if elapsed else 0.0,
+            "mb_per_s": events * size / (1 << 20) / elapsed if elapsed else 0.0,
+        })
+        print(f"  {size_label(size)} trial {trial + 1}/{trials}: {events} events in {elapsed:.3f}s "
+              f"({trial_results[-1]['mb_per_s']:.1f} MB/s)")
+    del payload
+
+    latencies.sort()
+    return {
+        "size": size,
+        "label": size_label(size),
+        "events_per_trial": events,
+        "trials": trial_results,
+        "events_per_s": describe([t["events_per_s"] for t in trial_results]),
+        "mb_per_s": describe([t["mb_per_s"] for t in trial_results]),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Microbenchmark story.log_event of the ChronoLog Python client across payload sizes"
+    )
+    parser.add_argument("-s", "--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated payload sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("-t", "--trials", type=int, default=TRIALS, help="Timed trials per size")
+    parser.add_argument("-w", "--warmup", type=int, default=WARMUP_EVENTS,
+                        help="Untimed warm-up events per size")
+    parser.add_argument("--bytes-per-trial", type=parse_size, default=BYTES_PER_TRIAL,
+                        help="Approximate payload volume of each trial, e.g. 64MB")
+    parser.add_argument("--max-events", type=int, default=MAX_EVENTS,
+                        help="Upper bound on events per trial")
+    parser.add_argument("--chronicle", default="bench_chronicle_log_event")
+    parser.add_argument("--story", default="bench_story_log_event")
+    parser.add_argument("-o", "--output", default=RESULTS_FILE, help="JSON results file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    session = get_session()
+    try:
+        start = time.perf_counter()
+        story = session.get_story(args.chronicle, args.story)
+        setup_s = time.perf_counter() - start
+    except RuntimeError as e:
+        print(f"Failed to acquire story ({e}). Exiting.")
+        return
+
+    results = []
+    for size in sizes:
+        print(f"Benchmarking {size_label(size)} events...")
+        try:
+            results.append(bench_size(story, size, args.trials, args.warmup,
+                                      args.bytes_per_trial, args.max_events))
+        except MemoryError:
+            print(f"  Not enough memory for {size_label(size)} payloads; skipping.")
+
+    start = time.perf_counter()
+    session.release_story(args.chronicle, args.story)
+    release_s = time.perf_counter() - start
+
+    print("\n--- log_event Results ---")
+    print(f"{'size':>8}{'events':>8}{'events/s':>14}{'MB/s':>12}{'± 95% CI':>12}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['label']:>8}{r['events_per_trial']:>8}{r['events_per_s']['mean']:>14.1f}"
+              f"{r['mb_per_s']['mean']:>12.1f}{r['mb_per_s']['ci95'] or 0.0:>12.1f}"
+              f"{r['latency_s']['p99'] * 1e3:>10.3f}")
+
+    report = {
+        "benchmark": "log_event",
+        "timestamp": time.time(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "chronicle": args.chronicle,
+        "story": args.story,
+        "trials": args.trials,
+        "warmup_events": args.warmup,
+        "setup_s": setup_s,
+        "release_s": release_s,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
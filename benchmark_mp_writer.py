@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import statistics
+import time
+
+from chronolog_session import ChronoLogSession
+from benchmark_log_event import describe, parse_size, size_label
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+
+# Python counterpart of benchmarks/mpiwritebuffer1gb.cpp: N workers, each
+# with its own ChronoLog client, log fixed-size events in parallel. Run it
+# plainly to fork workers with multiprocessing, or under mpiexec (with
+# mpi4py installed) to use one rank per worker.
+
+WORKER_COUNTS = "1,2,4,8"
+EVENT_SIZE = "1MB"
+EVENTS_PER_WORKER = 64
+TRIALS = 3
+RESULTS_FILE = "results/mp_writer_benchmark.json"
+
+
+def story_for(rank, args):
+    return args.story if args.story_mode == "shared" else f"{args.story}_{rank}"
+
+
+def write_events(session, chronicle, story, payload, events):
+    """Log `events` copies of `payload` on the raw story handle and time them."""
+    handle = session.get_story(chronicle, story)
+    start_wall = time.time()
+    start = time.perf_counter()
+    for _ in range(events):
+        handle.log_event(payload)
+    elapsed = time.perf_counter() - start
+    return {
+        "events": events,
+        "bytes": events * len(payload),
+        "elapsed_s": elapsed,
+        "start": start_wall,
+        "end": start_wall + elapsed,
+    }
+
+
+def summarize_run(workers, results):
+    """Aggregate throughput and per-worker skew of one parallel run."""
+    span = max(r["end"] for r in results) - min(r["start"] for r in results)
+    total_bytes = sum(r["bytes"] for r in results)
+    total_events = sum(r["events"] for r in results)
+    per_worker = [r["bytes"] / (1 << 20) / r["elapsed_s"] for r in results if r["elapsed_s"] > 0]
+    elapsed = [r["elapsed_s"] for r in results]
+    mean = statistics.fmean(per_worker) if per_worker else 0.0
+    return {
+        "workers": workers,
+        "span_s": span,
+        "events": total_events,
+        "mb_per_s": total_bytes / (1 << 20) / span if span > 0 else 0.0,
+        "events_per_s": total_events / span if span > 0 else 0.0,
+        "worker_mb_per_s": per_worker,
+        # Slowest over fastest worker, and spread of per-worker throughput
+        "skew": max(elapsed) / min(elapsed) if min(elapsed) > 0 else 0.0,
+        "worker_cv": statistics.pstdev(per_worker) / mean if mean else 0.0,
+    }
+
+
+def add_efficiency(points):
+    """Scaling efficiency of each worker count relative to the smallest one."""
+    base = points[0]
+    for p in points:
+        speedup = p["mb_per_s"]["mean"] / base["mb_per_s"]["mean"] if base["mb_per_s"]["mean"] else 0.0
+        p["speedup"] = speedup
+        p["efficiency"] = speedup / (p["workers"] / base["workers"])
+    return points
+
+
+def collect_point(workers, runs):
+    return {
+        "workers": workers,
+        "runs": runs,
+        "mb_per_s": describe([r["mb_per_s"] for r in runs]),
+        "events_per_s": describe([r["events_per_s"] for r in runs]),
+        "skew": statistics.fmean(r["skew"] for r in runs),
+        "worker_cv": statistics.fmean(r["worker_cv"] for r in runs),
+    }
+
+
+# --- multiprocessing ---
+
+def _mp_worker(rank, args, barrier, results):
+    session = ChronoLogSession()
+    try:
+        story = story_for(rank, args)
+        # Connect and acquire before the barrier so only writes are timed
+        session.get_story(args.chronicle, story)
+        payload = "x" * args.size
+        barrier.wait()
+        results.put(write_events(session, args.chronicle, story, payload, args.events))
+    except Exception as e:
+        barrier.abort()
+        results.put({"rank": rank, "error": str(e)})
+    finally:
+        session.close()
+
+
+def run_multiprocessing(args):
+    ctx = mp.get_context("spawn")
+    points = []
+    for workers in args.worker_counts:
+        runs = []
+        for trial in range(args.trials):
+            barrier = ctx.Barrier(workers)
+            results = ctx.Queue()
+            procs = [ctx.Process(target=_mp_worker, args=(rank, args, barrier, results))
+                     for rank in range(workers)]
+            for p in procs:
+                p.start()
+            gathered = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            errors = [r for r in gathered if "error" in r]
+            if errors:
+                raise RuntimeError(f"Worker {errors[0]['rank']} failed: {errors[0]['error']}")
+            runs.append(summarize_run(workers, gathered))
+            print(f"  {workers} workers, trial {trial + 1}/{args.trials}: "
+                  f"{runs[-1]['mb_per_s']:.1f} MB/s, skew {runs[-1]['skew']:.2f}")
+        points.append(collect_point(workers, runs))
+    return points
+
+
+# --- mpi4py ---
+
+def run_mpi(args):
+    """
+    Every rank keeps one client; for each worker count the first N ranks
+    write while the rest only join the barriers. Rank 0 gathers results.
+    """
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    session = ChronoLogSession()
+    payload = "x" * args.size
+    points = []
+    try:
+        for workers in [n for n in args.worker_counts if n <= comm.Get_size()]:
+            runs = []
+            for trial in range(args.trials):
+                active = rank < workers
+                if active:
+                    session.get_story(args.chronicle, story_for(rank, args))
+                comm.Barrier()
+                result = (write_events(session, args.chronicle, story_for(rank, args), payload, args.events)
+                          if active else None)
+                gathered = comm.gather(result, root=0)
+                if rank == 0:
+                    runs.append(summarize_run(workers, [r for r in gathered if r is not None]))
+                    print(f"  {workers} ranks, trial {trial + 1}/{args.trials}: "
+                          f"{runs[-1]['mb_per_s']:.1f} MB/s, skew {runs[-1]['skew']:.2f}")
+            if rank == 0:
+                points.append(collect_point(workers, runs))
+    finally:
+        session.close()
+    return points if rank == 0 else None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Parallel ChronoLog writer benchmark across worker processes or MPI ranks"
+    )
+    parser.add_argument("-n", "--workers", default=WORKER_COUNTS,
+                        help=f"Comma-separated worker counts to sweep (default: {WORKER_COUNTS})")
+    parser.add_argument("-s", "--size", type=parse_size, default=parse_size(EVENT_SIZE),
+                        help=f"Event size, e.g. 1KB, 1MB, 1GB (default: {EVENT_SIZE})")
+    parser.add_argument("-e", "--events", type=int, default=EVENTS_PER_WORKER,
+                        help="Events written by each worker per trial")
+    parser.add_argument("-t", "--trials", type=int, default=TRIALS, help="Trials per worker count")
+    parser.add_argument("--story-mode", choices=["distinct", "shared"], default="distinct",
+                        help="Give each worker its own story or write to one shared story")
+    parser.add_argument("--backend", choices=["auto", "multiprocessing", "mpi"], default="auto",
+                        help="auto uses MPI when launched under mpiexec with more than one rank")
+    parser.add_argument("--chronicle", default="bench_chronicle_mp")
+    parser.add_argument("--story", default="bench_story_mp")
+    parser.add_argument("-o", "--output", default=RESULTS_FILE, help="JSON results file")
+    args = parser.parse_args()
+    args.worker_counts = sorted({int(n) for n in args.workers.split(",") if n.strip()})
+    return args
+
+
+def main():
+    args = parse_args()
+    use_mpi = args.backend == "mpi" or (
+        args.backend == "auto" and MPI is not None and MPI.COMM_WORLD.Get_size() > 1)
+    if use_mpi and MPI is None:
+        raise SystemExit("--backend mpi needs mpi4py.")
+
+    backend = "mpi" if use_mpi else "multiprocessing"
+    if not use_mpi or MPI.COMM_WORLD.Get_rank() == 0:
+        print(f"Writing {size_label(args.size)} events, {args.events} per worker, "
+              f"{args.story_mode} stories, via {backend}...")
+    points = run_mpi(args) if use_mpi else run_multiprocessing(args)
+    if not points:
+        return
+    add_efficiency(points)
+
+    print("\n--- Parallel Writer Results ---")
+    print(f"{'workers':>8}{'MB/s':>12}{'± 95% CI':>12}{'events/s':>12}{'speedup':>10}"
+          f"{'efficiency':>12}{'skew':>8}")
+    for p in points:
+        print(f"{p['workers']:>8}{p['mb_per_s']['mean']:>12.1f}{p['mb_per_s']['ci95'] or 0.0:>12.1f}"
+              f"{p['events_per_s']['mean']:>12.1f}{p['speedup']:>10.2f}{p['efficiency']:>12.2f}"
+              f"{p['skew']:>8.2f}")
+
+    report = {
+        "benchmark": "mp_writer",
+        "timestamp": time.time(),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "backend": backend,
+        "story_mode": args.story_mode,
+        "event_size": args.size,
+        "events_per_worker": args.events,
+        "trials": args.trials,
+        "points": points,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
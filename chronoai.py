@@ -1,25 +1,9 @@
 import os
-import py_chronolog_client
+from log_writer import get_writer
 
 def ai_interaction(output):
-    # 1. Set up ChronoLog client
-    client_conf = py_chronolog_client.ClientPortalServiceConf("ofi+sockets", "127.0.0.1", 5555,55)
-    client = py_chronolog_client.Client(client_conf)
-    
-    # 2. Connect and prepare a chronicle + story
-    client.Connect()
-    code = client.CreateChronicle("chatgpt", {}, 1)
-    #print(code)
-    ret, story = client.AcquireStory("chatgpt", "conversation", {}, 1)
-    #print(ret, story)
-    if ret != 0:
-        raise RuntimeError("Failed to acquire story for logging.")
-        
-    # 4. Log prompt and response
+    # 1. Hand the entry to the background writer; it is logged through the
+    #    process-wide ChronoLog session without blocking the caller.
+    #    Call get_writer().flush() when the entry must be durable.
     log_entry = output
-    story.log_event(log_entry)
-    
-    # 5. Tear down
-    client.ReleaseStory("chatgpt", "conversation")
-    print("Released")
-    client.Disconnect()    
+    get_writer().submit("chatgpt", "conversation", log_entry)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from typing import Iterator, Optional
+
+# Unix socket the daemon listens on; CHRONOAI_SOCKET overrides it
+SOCKET_PATH = os.getenv("CHRONOAI_SOCKET", os.path.expanduser("~/.cache/chronoai/daemon.sock"))
+# CHRONOAI_DAEMON=0 makes the entry points always run in-process
+ENABLED = os.getenv("CHRONOAI_DAEMON", "1") != "0"
+# Clients give up on a daemon that does not accept within this many seconds
+CONNECT_TIMEOUT = 0.5
+# Stories acquired at start-up, as chronicle/story
+WARM_STORIES = ("chatgpt/database", "chatgpt/conversation")
+# Streamed items between socket flushes
+STREAM_FLUSH_EVERY = 256
+
+# This module is imported by the thin clients, so everything heavy (the
+# ChronoLog binding, h5py, PyPDF2, requests) is imported by the handlers.
+
+
+class DaemonError(RuntimeError):
+    """The daemon ran the request and it failed."""
+
+
+# --- Client ---
+
+class DaemonClient:
+    """
+    One connection to a running daemon. Requests are JSON lines
+    `{"op": ..., "args": {...}}`; the reply is `{"result": ...}` or
+    `{"error": ...}`, preceded by `{"item": ...}` lines for streamed ops.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    def _send(self, op, args):
+        self._file.write(json.dumps({"op": op, "args": args}).encode("utf-8") + b"\n")
+        self._file.flush()
+
+    def _receive(self) -> dict:
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("The daemon closed the connection.")
+        return json.loads(line)
+
+    def call(self, op: str, **args):
+        """
+        Run `op` in the daemon and return its result.
+
+        Raises:
+            DaemonError: If the op failed in the daemon.
+        """
+        self._send(op, args)
+        reply = self._receive()
+        if "error" in reply:
+            raise DaemonError(reply["error"])
+        return reply.get("result")
+
+    def stream(self, op: str, **args) -> Iterator:
+        """Run a streamed op and yield its items as they arrive."""
+        self._send(op, args)
+        while True:
+            reply = self._receive()
+            if "item" in reply:
+                yield reply["item"]
+            elif "error" in reply:
+                raise DaemonError(reply["error"])
+            else:
+                return
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+def connect_daemon(path: str = SOCKET_PATH) -> Optional[DaemonClient]:
+    """Connect to the daemon, or return None if it is not running (or disabled)."""
+    return _connect(path) if ENABLED else None
+
+
+def _connect(path):
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.settimeout(None)
+    except OSError:
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+
+# --- Server ops ---
+
+_started = time.time()
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def _reader_for(args):
+    """Readers (and their loaded indexes) are kept across retrieve requests."""
+    import retrieve_interaction
+    key = (args.backend, args.config, args.local_dir, args.index_dir)
+    with _readers_lock:
+        if key not in _readers:
+            _readers[key] = retrieve_interaction.make_reader(args)
+        return _readers[key]
+
+
+def op_ping():
+    from chronolog_session import get_session
+    return {"pid": os.getpid(), "uptime": time.time() - _started, "backend": get_session().backend}
+
+
+def op_gpt_interaction(prompt, conversation_id=None):
+    from chronoai_gpt import gpt_interaction
+    return gpt_interaction(prompt, conversation_id)
+
+
+def op_summarize_pdf(pdf_path, max_workers=None, token_budget=None, log_chunks=False, incremental=True):
+    import pdfparser
+    return pdfparser.summarize_pdf(
+        pdf_path,
+        max_workers=max_workers or pdfparser.MAX_WORKERS,
+        token_budget=token_budget or pdfparser.TOKEN_BUDGET,
+        log_chunks=log_chunks,
+        incremental=incremental,
+    )
+
+
+def op_retrieve(args):
+    import retrieve_interaction
+    args = argparse.Namespace(**args)
+    yield from retrieve_interaction.retrieve(args, reader=_reader_for(args))
+
+
+def op_log_event(chronicle, story, record):
+    from log_writer import get_writer
+    get_writer().submit(chronicle, story, record)
+    return True
+
+
+def op_flush(timeout=None):
+    from log_writer import get_writer
+    return get_writer().flush(timeout)
+
+
+def op_metrics():
+    from instrumentation import get_metrics
+    return get_metrics().snapshot()
+
+
+OPS = {
+    "ping": op_ping,
+    "gpt_interaction": op_gpt_interaction,
+    "summarize_pdf": op_summarize_pdf,
+    "retrieve": op_retrieve,
+    "log_event": op_log_event,
+    "flush": op_flush,
+    "metrics": op_metrics,
+}
+# Ops whose result is a sequence sent as one line per item
+STREAMED_OPS = {"retrieve"}
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """Serves JSON-line requests on one connection until the client hangs up."""
+
+    def _reply(self, message):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                if not self._serve(json.loads(line)):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-reply, e.g. its output was piped into head
+            pass
+
+    def _serve(self, request) -> bool:
+        """Answer one request; False once the connection should close."""
+        try:
+            op = request["op"]
+            if op == "shutdown":
+                self._reply({"result": True})
+                self.wfile.flush()
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return False
+            handler = OPS.get(op)
+            if handler is None:
+                raise KeyError(f"Unknown op {op!r}")
+            result = handler(**request.get("args", {}))
+            if op in STREAMED_OPS:
+                for count, item in enumerate(result, start=1):
+                    self._reply({"item": item})
+                    if count % STREAM_FLUSH_EVERY == 0:
+                        self.wfile.flush()
+                result = None
+            self._reply({"result": result})
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception as e:
+            print(f"Daemon request failed: {e}")
+            self._reply({"error": f"{type(e).__name__}: {e}"})
+        self.wfile.flush()
+        return True
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def warm_up(stories):
+    """Import the heavy modules and open everything a request would otherwise set up."""
+    import chronoai_gpt, pdfparser, retrieve_interaction, PyPDF2  # noqa: F401
+    from chronolog_session import get_session
+    from llm_client import get_ollama_client, get_openai_client
+    from log_writer import get_writer
+
+    get_openai_client()
+    get_ollama_client()
+    get_writer()
+    session = get_session()
+    for name in stories:
+        chronicle, _, story = name.partition("/")
+        try:
+            session.get_story(chronicle, story)
+        except RuntimeError as e:
+            # The writer spools events until ChronoLog is reachable
+            print(f"Could not acquire {name} ({e}); continuing.")
+
+
+def serve(path: str = SOCKET_PATH, stories=WARM_STORIES, warm: bool = True):
+    """Run the daemon in the foreground until SIGINT/SIGTERM or a shutdown request."""
+    existing = _connect(path)
+    if existing is not None:
+        existing.close()
+        raise SystemExit(f"A daemon is already listening on {path}.")
+    if os.path.exists(path):
+        # Left behind by a daemon that did not shut down cleanly
+        os.unlink(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    if warm:
+        start = time.perf_counter()
+        warm_up(stories)
+        print(f"Warmed up in {time.perf_counter() - start:.2f}s.")
+
+    server = DaemonServer(path, DaemonHandler)
+    os.chmod(path, 0o600)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"ChronoAI daemon listening on {path} (pid {os.getpid()}).")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        print("ChronoAI daemon stopped.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Keep a warm ChronoLog connection and LLM clients for main.py, "
+                    "pdfparser.py and retrieve_interaction.py"
+    )
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--story", action="append",
+                        help="chronicle/story to acquire at start-up (repeatable; "
+                             f"default: {', '.join(WARM_STORIES)})")
+    parser.add_argument("--no-warm", action="store_true",
+                        help="Skip warm-up; modules and connections are set up on first use")
+    parser.add_argument("--status", action="store_true", help="Report whether a daemon is running")
+    parser.add_argument("--stop", action="store_true", help="Ask the running daemon to exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.status or args.stop:
+        client = _connect(args.socket)
+        if client is None:
+            print(f"No daemon on {args.socket}.")
+            return
+        try:
+            if args.stop:
+                client.call("shutdown")
+                print("Daemon stopping.")
+            else:
+                print(json.dumps(client.call("ping"), indent=2))
+        finally:
+            client.close()
+        return
+    serve(args.socket, args.story or WARM_STORIES, warm=not args.no_warm)
+
+
+if __name__ == "__main__":
+    main()
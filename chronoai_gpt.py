@@ -1,39 +1,46 @@
-import os
-import openai
-import py_chronolog_client
+import time
+from log_writer import get_writer
+from event_codec import encode_event
+from instrumentation import phase
+from llm_client import get_openai_client
+from conversation import get_conversations
 
-# Set your OpenAI API key from environment variable
-openai.api_key = os.getenv("OPENAI_API_KEY")
+def gpt_interaction(prompt_text, conversation_id=None):
+    # 1. The event goes through the background writer's spool, so an
+    #    unreachable ChronoLog does not stop the interaction.
+    #    With a conversation_id, its recent turns are sent as context.
+    if conversation_id is not None:
+        messages = get_conversations().get(conversation_id).messages(prompt_text)
+    else:
+        messages = [{"role": "user", "content": prompt_text}]
 
-def gpt_interaction(prompt_text):
-    # 1. Set up ChronoLog client
-    client_conf = py_chronolog_client.ClientPortalServiceConf("ofi+sockets", "127.0.0.1", 5555,55)
-    client = py_chronolog_client.Client(client_conf)
-    
-    # 2. Connect and prepare a chronicle + story
-    client.Connect()
-    code = client.CreateChronicle("chatgpt", {}, 1)
-    #print(code)
-    ret, story = client.AcquireStory("chatgpt", "database", {}, 1)
-    print(ret, story)
-    if ret != 0:
-        raise RuntimeError("Failed to acquire story for logging.")
-    
-    # 3. Send prompt to ChatGPT
-    response = openai.ChatCompletion.create(
+    # 2. Send prompt to ChatGPT
+    start = time.perf_counter()
+    usage = {}
+    with phase("openai_completion"):
+        response = get_openai_client().complete(
+            "gpt-3.5-turbo",
+            messages,
+            temperature=0.7,
+            stats=usage,
+        )
+    latency = time.perf_counter() - start
+
+    # 3. Log prompt, response and call metadata
+    if conversation_id is not None:
+        usage["latency"] = latency
+        get_conversations().record_turn(conversation_id, prompt_text, response,
+                                        model="gpt-3.5-turbo", temperature=0.7, stats=usage)
+        return response
+    log_entry = encode_event(
+        prompt_text, response,
         model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt_text}],
-        temperature=0.7
-    ).choices[0].message["content"].strip()
-    
-    # 4. Log prompt and response
-    log_entry = f"Response: {response}"
-    story.log_event(log_entry)
-    
-    # 5. Tear down
-    client.ReleaseStory("chatgpt", "database")
-    print("Released")
-    client.Disconnect()
+        temperature=0.7,
+        latency=latency,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+    )
+    get_writer().submit("chatgpt", "database", log_entry)
     
     return response
 
@@ -0,0 +1,162 @@
+import atexit
+import threading
+from event_fragments import MAX_EVENT_BYTES, fragment_record
+from instrumentation import get_metrics, phase
+from storage_backend import BACKEND, client_api
+
+# Default ChronoVisor portal the scripts connect to
+PROTOCOL = "ofi+sockets"
+HOST = "127.0.0.1"
+PORT = 5555
+PROVIDER_ID = 55
+
+
+class ChronoLogSession:
+    """
+    Keeps one connected ChronoLog client for the whole process and caches the
+    story handles it has acquired, so callers only pay for Connect,
+    CreateChronicle and AcquireStory the first time a story is used.
+
+    `backend` picks where events go: "chronolog" (ChronoVisor through
+    py_chronolog_client) or "local" (segment files on this machine, see
+    storage_backend); CHRONOAI_BACKEND sets the default.
+
+    Records larger than `max_event_bytes` are logged as a series of fragment
+    events (see event_fragments) that the archive readers join back together.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, protocol=PROTOCOL, host=HOST, port=PORT, provider_id=PROVIDER_ID,
+                 max_event_bytes=MAX_EVENT_BYTES, backend=BACKEND):
+        self._conf_args = (protocol, host, port, provider_id)
+        self.backend = backend
+        self.max_event_bytes = max_event_bytes
+        self._lock = threading.RLock()
+        self._client = None
+        self._chronicles = set()
+        self._stories = {}
+
+    def _connect(self):
+        conf_class, client_class = client_api(self.backend)
+        client_conf = conf_class(*self._conf_args)
+        client = client_class(client_conf)
+        with phase("connect"):
+            ret = client.Connect()
+        if ret != 0:
+            get_metrics().inc("errors", phase="connect")
+            raise RuntimeError(f"client.Connect() returned {ret}")
+        self._client = client
+
+    def get_story(self, chronicle, story, attrs=None):
+        """
+        Return the handle for (chronicle, story), acquiring it on first use.
+
+        Raises:
+            RuntimeError: If the client cannot connect or the story cannot be acquired.
+        """
+        key = (chronicle, story)
+        handle = self._stories.get(key)
+        if handle is not None:
+            return handle
+
+        with self._lock:
+            handle = self._stories.get(key)
+            if handle is not None:
+                return handle
+            if self._client is None:
+                self._connect()
+            attrs = attrs if attrs is not None else {}
+            if chronicle not in self._chronicles:
+                # An already existing chronicle is not an error for our purposes
+                with phase("create_chronicle"):
+                    self._client.CreateChronicle(chronicle, attrs, 1)
+                self._chronicles.add(chronicle)
+            with phase("acquire_story"):
+                ret, handle = self._client.AcquireStory(chronicle, story, attrs, 1)
+            if ret != 0:
+                get_metrics().inc("errors", phase="acquire_story")
+                raise RuntimeError(f"Failed to acquire story {chronicle}/{story} for logging ({ret}).")
+            self._stories[key] = handle
+            return handle
+
+    def log_event(self, chronicle, story, record):
+        """
+        Log one record to (chronicle, story), split into fragments when it
+        is larger than `max_event_bytes`. If a write fails the session
+        reconnects once and retries before giving up.
+        """
+        ret = None
+        for event in fragment_record(record, self.max_event_bytes):
+            ret = self._log_one(chronicle, story, event)
+        return ret
+
+    def _log_one(self, chronicle, story, record):
+        handle = self.get_story(chronicle, story)
+        try:
+            with phase("log_event"):
+                ret = handle.log_event(record)
+        except Exception as e:
+            print(f"log_event on {chronicle}/{story} failed ({e}); reconnecting...")
+            self.reconnect()
+            with phase("log_event"):
+                ret = self.get_story(chronicle, story).log_event(record)
+        metrics = get_metrics()
+        metrics.inc("events_logged")
+        metrics.inc("bytes_logged", len(record.encode("utf-8")) if isinstance(record, str) else len(record))
+        return ret
+
+    def release_story(self, chronicle, story):
+        """Release a single cached story handle, if it is held."""
+        with self._lock:
+            if self._stories.pop((chronicle, story), None) is not None and self._client is not None:
+                with phase("release_story"):
+                    return self._client.ReleaseStory(chronicle, story)
+            return None
+
+    def reconnect(self):
+        """Drop the current connection; the next call reconnects and re-acquires stories."""
+        with self._lock:
+            self._teardown(quiet=True)
+
+    def close(self):
+        """Release every acquired story and disconnect the client."""
+        with self._lock:
+            self._teardown(quiet=False)
+
+    def _teardown(self, quiet):
+        client = self._client
+        stories = list(self._stories)
+        self._client = None
+        self._stories.clear()
+        self._chronicles.clear()
+        if client is None:
+            return
+        for chronicle, story in stories:
+            try:
+                with phase("release_story"):
+                    client.ReleaseStory(chronicle, story)
+            except Exception as e:
+                if not quiet:
+                    print(f"client.ReleaseStory({chronicle}, {story}) failed: {e}")
+        try:
+            with phase("disconnect"):
+                client.Disconnect()
+        except Exception as e:
+            if not quiet:
+                print(f"client.Disconnect() failed: {e}")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide ChronoLog session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = ChronoLogSession()
+                atexit.register(_session.close)
+    return _session
@@ -0,0 +1,234 @@
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Optional
+
+from event_codec import decode_event, encode_event
+from instrumentation import phase
+from log_writer import get_writer
+from storage_backend import BACKEND, LocalStoreReader
+
+# Every conversation is one story in this chronicle, named by its id
+CHRONICLE = "conversations"
+# History kept in a prompt, estimated at ~4 characters per token
+TOKEN_BUDGET = int(os.getenv("CHRONOAI_CONTEXT_TOKENS", 3000))
+# Ring buffer length, whatever the budget
+MAX_TURNS = 64
+# Conversations kept in memory; the least recently used are dropped first
+MAX_CONVERSATIONS = 256
+# Turn counts remembered for evicted conversations, most recently evicted kept
+MAX_EVICTED_COUNTS = 4096
+# Grapher config used to find the archive when reloading a conversation from ChronoLog
+GRAPHER_CONF = os.getenv("CHRONOAI_GRAPHER_CONF")
+
+# Story names end up in archive file names split on "."
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough token count (~4 characters per token); no tokenizer needed."""
+    return max(1, (len(text or "") + 3) // 4)
+
+
+class Conversation:
+    """
+    Recent turns of one conversation in a ring buffer, trimmed from the
+    oldest end whenever the estimated tokens exceed `token_budget`. Adding
+    a turn and building the next prompt cost the same however long the
+    conversation has run.
+    """
+
+    def __init__(self, conversation_id: str, system: Optional[str] = None,
+                 token_budget: int = TOKEN_BUDGET, max_turns: int = MAX_TURNS):
+        self.id = conversation_id
+        self.system = system
+        self.token_budget = token_budget
+        self._turns = deque(maxlen=max_turns)
+        self._tokens = 0
+        self._lock = threading.Lock()
+        # Turns ever added, including those trimmed away or loaded from the story
+        self.turn_count = 0
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def __len__(self):
+        return len(self._turns)
+
+    def add_turn(self, prompt: str, response: str, tokens: Optional[int] = None) -> int:
+        """Append a turn, trim to the budget, and return the turn's number."""
+        tokens = tokens if tokens is not None else estimate_tokens(prompt) + estimate_tokens(response)
+        with self._lock:
+            if len(self._turns) == self._turns.maxlen:
+                self._tokens -= self._turns[0][2]
+            self._turns.append((prompt, response, tokens))
+            self._tokens += tokens
+            # Always keep the newest turn, even if it alone is over budget
+            while len(self._turns) > 1 and self._tokens > self.token_budget:
+                self._tokens -= self._turns.popleft()[2]
+            self.turn_count += 1
+            return self.turn_count
+
+    def prepend_turn(self, prompt: str, response: str, tokens: Optional[int] = None) -> bool:
+        """
+        Insert an older turn in front (used when loading from the story).
+
+        Returns:
+            bool: False, without inserting, once the buffer or budget is full.
+        """
+        tokens = tokens if tokens is not None else estimate_tokens(prompt) + estimate_tokens(response)
+        with self._lock:
+            if len(self._turns) == self._turns.maxlen or (
+                    self._turns and self._tokens + tokens > self.token_budget):
+                return False
+            self._turns.appendleft((prompt, response, tokens))
+            self._tokens += tokens
+            return True
+
+    def messages(self, prompt: Optional[str] = None) -> list[dict]:
+        """Chat messages for the next request: system, the kept turns, then `prompt`."""
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        with self._lock:
+            for turn_prompt, turn_response, _ in self._turns:
+                messages.append({"role": "user", "content": turn_prompt})
+                messages.append({"role": "assistant", "content": turn_response})
+        if prompt is not None:
+            messages.append({"role": "user", "content": prompt})
+        return messages
+
+
+def default_reader():
+    """
+    Reader for reloading conversations: the local store, or the ChronoLog
+    archive named by CHRONOAI_GRAPHER_CONF. None when neither is available,
+    in which case conversations only live in memory.
+    """
+    if BACKEND == "local":
+        return LocalStoreReader()
+    if GRAPHER_CONF:
+        # h5py is only needed once an archive is actually read
+        from archive_index import IndexedArchiveReader
+        from archive_reader import story_files_dir_from_config
+        return IndexedArchiveReader(story_files_dir_from_config(GRAPHER_CONF))
+    return None
+
+
+class ConversationManager:
+    """
+    Conversations by id, most recently used kept in memory. A conversation
+    that is not in memory (first use in this process, or evicted) is rebuilt
+    from the tail of its story: files are read newest first, and reading
+    stops as soon as the token budget is full.
+    """
+
+    def __init__(self, reader=None, chronicle: str = CHRONICLE, system: Optional[str] = None,
+                 token_budget: int = TOKEN_BUDGET, max_turns: int = MAX_TURNS,
+                 max_conversations: int = MAX_CONVERSATIONS):
+        self.reader = reader
+        self.chronicle = chronicle
+        self.system = system
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        # Turn counts of evicted conversations, since their stories may lag
+        # behind the writer; older entries fall back to the story's tail
+        self._turn_counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> Conversation:
+        """
+        Return the conversation, loading its tail from the story on a miss.
+
+        Raises:
+            ValueError: If the id is not usable as a story name.
+        """
+        if not _VALID_ID.match(conversation_id):
+            raise ValueError(f"Conversation id {conversation_id!r} must match {_VALID_ID.pattern}")
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                self._conversations.move_to_end(conversation_id)
+                return conversation
+        conversation = Conversation(conversation_id, self.system, self.token_budget, self.max_turns)
+        with self._lock:
+            conversation.turn_count = self._turn_counts.get(conversation_id, 0)
+        if self.reader is not None:
+            with phase("conversation_load_tail"):
+                self._load_tail(conversation)
+        with self._lock:
+            # Another thread may have loaded it meanwhile; keep the first one
+            conversation = self._conversations.setdefault(conversation_id, conversation)
+            self._conversations.move_to_end(conversation_id)
+            self._turn_counts.pop(conversation_id, None)
+            while len(self._conversations) > self.max_conversations:
+                evicted_id, evicted = self._conversations.popitem(last=False)
+                self._turn_counts[evicted_id] = evicted.turn_count
+                if len(self._turn_counts) > MAX_EVICTED_COUNTS:
+                    self._turn_counts.popitem(last=False)
+        return conversation
+
+    def _load_tail(self, conversation: Conversation):
+        files = self.reader.story_files(self.chronicle, conversation.id)
+        loaded = 0
+        # Time windows between consecutive file starts, newest first
+        for i in range(len(files) - 1, -1, -1):
+            start = files[i][0]
+            end = files[i + 1][0] - 1 if i + 1 < len(files) else None
+            events = list(self.reader.read_story(self.chronicle, conversation.id, start, end))
+            for _, _, _, record in reversed(events):
+                try:
+                    event = decode_event(record)
+                except (ValueError, RuntimeError):
+                    continue
+                if event.get("prompt") is None or event.get("response") is None:
+                    continue
+                if loaded == 0:
+                    conversation.turn_count = max(conversation.turn_count,
+                                                  (event.get("extra") or {}).get("turn", 0))
+                if not conversation.prepend_turn(event["prompt"], event["response"]):
+                    return
+                loaded += 1
+
+    def record_turn(self, conversation_id: str, prompt: str, response: str, *,
+                    model: Optional[str] = None, temperature: Optional[float] = None,
+                    stats: Optional[dict] = None, writer=None) -> int:
+        """
+        Add a turn to the conversation and log it to the conversation's story.
+
+        Returns:
+            int: The turn's number within the conversation.
+        """
+        stats = stats or {}
+        conversation = self.get(conversation_id)
+        completion_tokens = stats.get("completion_tokens")
+        tokens = estimate_tokens(prompt) + (completion_tokens or estimate_tokens(response))
+        turn = conversation.add_turn(prompt, response, tokens)
+        record = encode_event(
+            prompt, response,
+            model=model,
+            temperature=temperature,
+            latency=stats.get("latency"),
+            prompt_tokens=stats.get("prompt_tokens"),
+            completion_tokens=completion_tokens,
+            source="cache" if stats.get("cached") else "llm",
+            extra={"conversation": conversation_id, "turn": turn},
+        )
+        (writer if writer is not None else get_writer()).submit(self.chronicle, conversation_id, record)
+        return turn
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_conversations() -> ConversationManager:
+    """Return the process-wide ConversationManager, creating it on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ConversationManager(default_reader())
+    return _manager
@@ -0,0 +1,193 @@
+import json
+import re
+import struct
+import uuid
+import zlib
+from typing import Optional, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Binary events start with a NUL byte, which never begins a text record
+MAGIC = b"\x00CAI"
+VERSION = 1
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+COMPRESS_NONE = 0
+COMPRESS_ZLIB = 1
+COMPRESS_ZSTD = 2
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 256
+
+# Identifies every event written by this process
+PROCESS_SESSION_ID = uuid.uuid4().hex[:16]
+
+# Field name -> short key used on the wire
+FIELDS = {
+    "model": "m",
+    "temperature": "t",
+    "prompt": "p",
+    "response": "r",
+    "latency": "l",
+    "prompt_tokens": "pt",
+    "completion_tokens": "ct",
+    "session_id": "s",
+    "source": "src",
+    "extra": "x",
+}
+_SHORT = {v: k for k, v in FIELDS.items()}
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def encode_event(prompt: Optional[str] = None, response: Optional[str] = None, *,
+                 model: Optional[str] = None, temperature: Optional[float] = None,
+                 latency: Optional[float] = None, prompt_tokens: Optional[int] = None,
+                 completion_tokens: Optional[int] = None,
+                 session_id: Optional[str] = PROCESS_SESSION_ID,
+                 source: Optional[str] = None, extra: Optional[dict] = None,
+                 compress: bool = True) -> bytes:
+    """
+    Encode one interaction as a versioned binary event.
+
+    Layout: MAGIC, version byte, flags byte (codec in bits 0-1, compression
+    in bits 2-3), then the body. The body is a msgpack map (JSON when msgpack
+    is not installed) using the short keys in FIELDS, and is compressed with
+    zstd (zlib as a fallback) when that makes it smaller.
+    """
+    values = {
+        "model": model,
+        "temperature": temperature,
+        "prompt": prompt,
+        "response": response,
+        "latency": round(latency, 6) if latency is not None else None,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "session_id": session_id,
+        "source": source,
+        "extra": extra,
+    }
+    body_map = {FIELDS[k]: v for k, v in values.items() if v is not None}
+    if msgpack is not None:
+        codec, body = CODEC_MSGPACK, msgpack.packb(body_map, use_bin_type=True)
+    else:
+        codec, body = CODEC_JSON, json.dumps(body_map, separators=(",", ":")).encode("utf-8")
+
+    compression = COMPRESS_NONE
+    if compress and len(body) >= COMPRESS_MIN_BYTES:
+        if _zstd_compressor is not None:
+            packed, method = _zstd_compressor.compress(body), COMPRESS_ZSTD
+        else:
+            packed, method = zlib.compress(body, 6), COMPRESS_ZLIB
+        if len(packed) < len(body):
+            compression, body = method, packed
+
+    return MAGIC + struct.pack("BB", VERSION, codec | (compression << 2)) + body
+
+
+def is_encoded(record: Union[bytes, str]) -> bool:
+    return isinstance(record, (bytes, bytearray, memoryview)) and bytes(record[:4]) == MAGIC
+
+
+_LABELS = {
+    "Prompt": "prompt",
+    "Response": "response",
+    "Partial response": "response",
+    "Source": "source",
+}
+_LABEL_LINE = re.compile(r"^(Prompt|Response|Partial response|Source): ?(.*)$")
+
+
+def _decode_text(text: str) -> dict:
+    """Parse the legacy "Prompt: ...\\nResponse: ..." records."""
+    event = {"version": 0}
+    current = None
+    for line in text.split("\n"):
+        match = _LABEL_LINE.match(line)
+        if match:
+            current = _LABELS[match.group(1)]
+            event[current] = match.group(2)
+            if match.group(1) == "Partial response":
+                event["extra"] = {"partial": True}
+        elif current is None:
+            # Not a prompt/response record; keep it as free text
+            return {"version": 0, "text": text}
+        else:
+            event[current] += "\n" + line
+    return event
+
+
+def decode_event(record: Union[bytes, str]) -> dict:
+    """
+    Decode a binary event, or parse a legacy plain-text record.
+
+    Returns:
+        dict: The event's fields under their full names plus `version`
+        (0 for plain text). Unstructured text comes back as `text`.
+    """
+    if not is_encoded(record):
+        if isinstance(record, (bytes, bytearray, memoryview)):
+            record = bytes(record).decode("utf-8", errors="replace")
+        return _decode_text(record)
+
+    record = bytes(record)
+    version, flags = struct.unpack_from("BB", record, len(MAGIC))
+    if version > VERSION:
+        raise ValueError(f"Unsupported event version {version}")
+    body = record[len(MAGIC) + 2:]
+    compression = (flags >> 2) & 0x3
+    if compression == COMPRESS_ZSTD:
+        if _zstd_decompressor is None:
+            raise RuntimeError("zstandard is required to decode this event")
+        body = _zstd_decompressor.decompress(body)
+    elif compression == COMPRESS_ZLIB:
+        body = zlib.decompress(body)
+
+    codec = flags & 0x3
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("msgpack is required to decode this event")
+        body_map = msgpack.unpackb(body, raw=False)
+    else:
+        body_map = json.loads(body)
+
+    event = {"version": version}
+    for key, value in body_map.items():
+        event[_SHORT.get(key, key)] = value
+    return event
+
+
+def event_text(record: Union[bytes, str]) -> str:
+    """Searchable text of a record: prompt and response, or the raw text."""
+    event = decode_event(record)
+    if "text" in event:
+        return event["text"]
+    return "\n".join(event[k] for k in ("prompt", "response") if event.get(k))
+
+
+def format_event(event: dict) -> str:
+    """Human-readable rendering used by the retrieval CLI."""
+    if "text" in event:
+        return event["text"]
+    lines = []
+    if event.get("prompt") is not None:
+        lines.append(f"Prompt: {event['prompt']}")
+    if event.get("response") is not None:
+        label = "Partial response" if (event.get("extra") or {}).get("partial") else "Response"
+        lines.append(f"{label}: {event['response']}")
+    meta = [f"{k}={event[k]}" for k in ("model", "temperature", "latency", "prompt_tokens",
+                                        "completion_tokens", "session_id", "source")
+            if event.get(k) is not None]
+    if meta:
+        lines.append("[" + ", ".join(meta) + "]")
+    return "\n".join(lines)
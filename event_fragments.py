@@ -0,0 +1,164 @@
+import os
+import struct
+import uuid
+import zlib
+from collections import deque
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+# Fragments start with a NUL byte too, so they never look like a text record
+FRAGMENT_MAGIC = b"\x00CAF"
+# payload id, fragment seq, fragment count, fragment crc32, payload crc32
+_HEADER = struct.Struct("<16sIIII")
+HEADER_SIZE = len(FRAGMENT_MAGIC) + _HEADER.size
+
+# Records larger than this are split; CHRONOAI_MAX_EVENT_BYTES overrides it
+MAX_EVENT_BYTES = int(os.getenv("CHRONOAI_MAX_EVENT_BYTES", 256 * 1024))
+# Stop buffering fragments once this many payloads are incomplete at once
+MAX_PENDING_PAYLOADS = 1024
+# Records held back behind an incomplete payload before it is given up on
+MAX_HELD_RECORDS = 100000
+# Records read past the end of a range, without finding a missing fragment,
+# before the payload is given up on
+EXTEND_SLACK = 1024
+
+_DROPPED = object()
+
+
+def is_fragment(record) -> bool:
+    return isinstance(record, (bytes, bytearray, memoryview)) and bytes(record[:4]) == FRAGMENT_MAGIC
+
+
+def fragment_record(record: Union[bytes, str], max_bytes: int = MAX_EVENT_BYTES) -> list:
+    """
+    Split a record larger than `max_bytes` into ordered fragment events.
+
+    Each fragment is FRAGMENT_MAGIC followed by a header (payload id, seq,
+    count, crc32 of the fragment, crc32 of the whole payload) and a slice of
+    the payload, and is at most `max_bytes` long.
+
+    Returns:
+        list: `[record]` unchanged when it fits, otherwise the fragments.
+    """
+    size = len(record.encode("utf-8")) if isinstance(record, str) else len(record)
+    if size <= max_bytes:
+        return [record]
+    if max_bytes <= HEADER_SIZE:
+        raise ValueError(f"max_bytes must be larger than the {HEADER_SIZE}-byte fragment header")
+
+    payload = record.encode("utf-8") if isinstance(record, str) else bytes(record)
+    step = max_bytes - HEADER_SIZE
+    payload_id = uuid.uuid4().bytes
+    payload_crc = zlib.crc32(payload)
+    total = (len(payload) + step - 1) // step
+    fragments = []
+    for seq in range(total):
+        part = payload[seq * step:(seq + 1) * step]
+        header = _HEADER.pack(payload_id, seq, total, zlib.crc32(part), payload_crc)
+        fragments.append(FRAGMENT_MAGIC + header + part)
+    return fragments
+
+
+def reassemble(records: Iterable[tuple[int, int, int, bytes]],
+               more: Optional[Callable[[int], Iterable[tuple[int, int, int, bytes]]]] = None,
+               incomplete: Optional[list] = None) -> Iterator[tuple[int, int, int, bytes]]:
+    """
+    Pass (timestamp, client_id, index, record) tuples through, joining
+    fragments back into their original payload.
+
+    A reassembled payload takes the timestamp, client id and index of its
+    first fragment, and the output keeps the input's order: records that
+    follow a first fragment are held until its payload is complete, so
+    timestamp-ordered input gives timestamp-ordered output.
+
+    Fragments whose first fragment is not among the records (it belongs to
+    an earlier range) are skipped. Payloads that start among the records
+    but end after them are completed from `more(after_timestamp)`, when
+    given, which should yield the records that follow. Payloads that are
+    still incomplete when the records run out (their last fragments may not
+    have been logged yet) are skipped, and their first timestamps appended
+    to `incomplete`. Payloads with a bad checksum are dropped with a message.
+    """
+    pending = {}
+    # Output in input order; a payload's slot stays empty until it is complete
+    slots: deque = deque()
+    last_ts = None
+
+    def drop(payload_id, reason):
+        entry = pending.pop(payload_id)
+        entry["slot"][0] = _DROPPED
+        print(f"Dropping payload {payload_id.hex()}: {reason}.")
+
+    def add(ts, client_id, index, record, accept_new=True) -> bool:
+        """Take one record; True if it was a fragment of a pending payload."""
+        if not is_fragment(record):
+            if accept_new:
+                slots.append([(ts, client_id, index, record)])
+            return False
+
+        record = bytes(record)
+        payload_id, seq, total, crc, payload_crc = _HEADER.unpack_from(record, len(FRAGMENT_MAGIC))
+        entry = pending.get(payload_id)
+        if entry is None and (not accept_new or seq != 0):
+            return False
+        part = record[HEADER_SIZE:]
+        if zlib.crc32(part) != crc:
+            if entry is not None:
+                drop(payload_id, f"checksum mismatch in fragment {seq + 1}/{total}")
+            else:
+                print(f"Dropping fragment {seq + 1}/{total} of payload {payload_id.hex()}: checksum mismatch.")
+            return entry is not None
+        if entry is None:
+            if len(pending) >= MAX_PENDING_PAYLOADS:
+                drop(next(iter(pending)), "too many payloads in flight")
+            entry = pending[payload_id] = {"key": (ts, client_id, index), "parts": {}, "slot": [None]}
+            slots.append(entry["slot"])
+        entry["parts"][seq] = part
+        if len(entry["parts"]) == total:
+            del pending[payload_id]
+            payload = b"".join(entry["parts"][i] for i in range(total))
+            if zlib.crc32(payload) != payload_crc:
+                entry["slot"][0] = _DROPPED
+                print(f"Dropping payload {payload_id.hex()}: checksum mismatch after reassembly.")
+            else:
+                entry["slot"][0] = entry["key"] + (payload,)
+        return True
+
+    def ready():
+        while slots and slots[0][0] is not None:
+            item = slots.popleft()[0]
+            if item is not _DROPPED:
+                yield item
+
+    for ts, client_id, index, record in records:
+        last_ts = ts
+        add(ts, client_id, index, record)
+        if len(slots) > MAX_HELD_RECORDS and slots[0][0] is None:
+            oldest = next(payload_id for payload_id, entry in pending.items() if entry["slot"] is slots[0])
+            drop(oldest, f"its fragments are more than {MAX_HELD_RECORDS} records apart")
+        yield from ready()
+
+    exhausted = True
+    if pending and more is not None:
+        # The range ended inside a payload; read on just far enough to finish it
+        since_progress = 0
+        for ts, client_id, index, record in more(last_ts + 1):
+            if add(ts, client_id, index, record, accept_new=False):
+                since_progress = 0
+                if not pending:
+                    break
+            else:
+                since_progress += 1
+                if since_progress > EXTEND_SLACK:
+                    exhausted = False
+                    break
+
+    for payload_id, entry in list(pending.items()):
+        if exhausted and incomplete is not None:
+            incomplete.append(entry["key"][0])
+            entry["slot"][0] = _DROPPED
+            del pending[payload_id]
+            print(f"Payload {payload_id.hex()} is incomplete ({len(entry['parts'])} fragments read); "
+                  f"skipping it until the rest is logged.")
+        else:
+            drop(payload_id, f"incomplete, only {len(entry['parts'])} fragments found")
+    yield from ready()
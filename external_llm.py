@@ -1,12 +1,13 @@
-import os
-import time
-import openai
-import py_chronolog_client
+from chronolog_session import get_session
+from log_writer import get_writer
+from llm_cache import cached_completion
+from event_codec import encode_event
+from instrumentation import phase
+from llm_client import OPENAI_BASE_URL, get_openai_client
+from conversation import get_conversations
 
-# Set your OpenAI API key from environment variable
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-def chat_with_gpt(prompt, model="gpt-3.5-turbo", temperature=0.7):
+def chat_with_gpt(prompt, model="gpt-3.5-turbo", temperature=0.7, stats=None, use_cache=True,
+                  base_url=None):
     """
     Sends a prompt to the ChatGPT API and returns the response.
     
@@ -14,47 +15,79 @@ def chat_with_gpt(prompt, model="gpt-3.5-turbo", temperature=0.7):
         prompt (str): The user's prompt.
         model (str): The model name (default: "gpt-3.5-turbo").
         temperature (float): Controls randomness (default: 0.7).
+        stats (dict): If given, `stats["cached"]` tells whether the response
+            was served from the prompt cache, `stats["latency"]` how long it
+            took, and `prompt_tokens`/`completion_tokens` the API's usage.
+        use_cache (bool): Look the prompt up in the prompt/response cache first.
+        base_url (str): OpenAI-compatible API base URL (default OPENAI_BASE_URL).
         
     Returns:
         str: The response text from ChatGPT.
     """
-    try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-        )
-        return response.choices[0].message['content'].strip()
-    except Exception as e:
-        print(f"Error in chat_with_gpt: {e}")
-        return None
+    messages = [{"role": "user", "content": prompt}]
+
+    def call():
+        try:
+            with phase("openai_completion"):
+                return get_openai_client(base_url).complete(model, messages, temperature, stats)
+        except Exception as e:
+            print(f"Error in chat_with_gpt: {e}")
+            return None
+
+    return cached_completion(model, temperature, messages, call, stats=stats, use_cache=use_cache,
+                             endpoint=(base_url or OPENAI_BASE_URL).rstrip("/"))
+
+def gpt_chat(conversation_id, prompt, model="gpt-3.5-turbo", temperature=0.7, stats=None, use_cache=True,
+             base_url=None):
+    """
+    Sends one turn of a multi-turn conversation to the ChatGPT API, with the
+    conversation's recent turns as context, and logs the turn to the
+    conversation's story.
+
+    Args:
+        conversation_id (str): Conversation (and story) name.
+        prompt (str): The user's new message.
+        model, temperature, stats, use_cache, base_url: As for chat_with_gpt.
+
+    Returns:
+        str: The response text, or None if the request failed.
+    """
+    stats = stats if stats is not None else {}
+    conversations = get_conversations()
+    messages = conversations.get(conversation_id).messages(prompt)
+
+    def call():
+        try:
+            with phase("openai_completion"):
+                return get_openai_client(base_url).complete(model, messages, temperature, stats)
+        except Exception as e:
+            print(f"Error in gpt_chat: {e}")
+            return None
+
+    response = cached_completion(model, temperature, messages, call, stats=stats, use_cache=use_cache,
+                                 endpoint=(base_url or OPENAI_BASE_URL).rstrip("/"))
+    if response is not None:
+        conversations.record_turn(conversation_id, prompt, response, model=model,
+                                  temperature=temperature, stats=stats)
+    return response
 
 def main():
     # --- ChronoLog Client Setup ---
     print("Connecting to ChronoLog...")
-    clientConf = py_chronolog_client.ClientPortalServiceConf("ofi+sockets", "127.0.0.1", 5555, 55)
-    client = py_chronolog_client.Client(clientConf)
-    
-    return_code = client.Connect()
-    print("client.Connect() returns:", return_code)
-    
-    attrs = dict()
-    return_code = client.CreateChronicle("py_chronicle", attrs, 1)
-    print("client.CreateChronicle() returns:", return_code)
-    
-    return_tuple = client.AcquireStory("py_chronicle", "chatgpt_test_story", attrs, 1)
-    print("client.AcquireStory() returns:", return_tuple)
-    
-    if return_tuple[0] != 0:
-        print("Failed to acquire story. Exiting.")
-        return
-    story = return_tuple[1]
+    session = get_session()
+    try:
+        session.get_story("py_chronicle", "chatgpt_test_story")
+    except RuntimeError as e:
+        # Events are spooled locally and replayed once ChronoLog is back
+        print(f"Failed to acquire story ({e}). Continuing; events will be spooled.")
+    writer = get_writer()
 
     # --- Loop to Send 100 Prompts and Log Responses ---
     for i in range(1, 101):
         prompt = f"Test prompt {i}: Tell me something interesting about the number {i}."
         print(f"\nSending prompt {i}: {prompt}")
-        response = chat_with_gpt(prompt)
+        stats = {}
+        response = chat_with_gpt(prompt, stats=stats)
         
         if response:
             print("Received response:")
@@ -62,20 +95,23 @@ def main():
         else:
             response = "No response received due to an error."
         
-        # Combine prompt and response into one log message
-        log_message = f"Prompt: {prompt}\nResponse: {response}"
-        print("Logging event to ChronoLog...")
-        story.log_event(log_message)
-        
-        # Optional: Pause briefly to avoid hitting API rate limits.
-        time.sleep(1)
+        # Log prompt, response and call metadata as one event
+        log_message = encode_event(
+            prompt, response,
+            model="gpt-3.5-turbo",
+            temperature=0.7,
+            latency=stats.get("latency"),
+            prompt_tokens=stats.get("prompt_tokens"),
+            completion_tokens=stats.get("completion_tokens"),
+            source="cache" if stats.get("cached") else "llm",
+        )
+        print("Queueing event for ChronoLog...")
+        writer.submit("py_chronicle", "chatgpt_test_story", log_message)
 
     # --- Clean Up ChronoLog Client ---
-    return_code = client.ReleaseStory("py_chronicle", "chatgpt_test_story")
-    print("\nclient.ReleaseStory() returns:", return_code)
-    
-    return_code = client.Disconnect()
-    print("client.Disconnect() returns:", return_code)
+    writer.close()
+    print("\nWritten events:", writer.written, "failed:", writer.failed)
+    session.close()
 
 if __name__ == "__main__":
     main()
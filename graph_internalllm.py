@@ -1,31 +1,45 @@
+import sys
 import matplotlib.pyplot as plt
+from graph_log_event import LOG_EVENT_RESULTS, load_results, plot_log_event
 
-# --- Sample benchmark results (in seconds) ---
-duration_without = 513.82   # e.g., benchmark without logging
-duration_with = 541.92      # e.g., benchmark with logging
+# --- Benchmark results written by benchmark_internalllm.py ---
+RESULTS_FILE = "results/internal_benchmark.json"
+
+report = load_results(sys.argv[1] if len(sys.argv) > 1 else RESULTS_FILE)
+if report is None:
+    sys.exit(1)
+duration_without = report["duration_without"]
+duration_with = report["duration_with"]
+
+# The log_event microbenchmark, when available, goes in a second panel
+log_event_report = load_results(LOG_EVENT_RESULTS)
 
 # --- Data for the graph ---
 labels = ['Without ChronoLog Logging', 'With ChronoLog Logging']
 times = [duration_without, duration_with]
 
 # --- Create the bar chart ---
-plt.figure(figsize=(8, 6))
-bars = plt.bar(labels, times, color=['tomato', 'gold'], edgecolor='black')
+if log_event_report is None:
+    fig, ax = plt.subplots(figsize=(8, 6))
+else:
+    fig, (ax, ax_log_event) = plt.subplots(1, 2, figsize=(16, 6))
+    plot_log_event(ax_log_event, log_event_report)
+bars = ax.bar(labels, times, color=['tomato', 'gold'], edgecolor='black')
 
-plt.xlabel('Logging Mode', fontsize=14)
-plt.ylabel('Duration (seconds)', fontsize=14)
-plt.title('Benchmark of Internal LLM \n with and without ChronoLog logging', fontsize=16, fontweight='bold')
+ax.set_xlabel('Logging Mode', fontsize=14)
+ax.set_ylabel('Duration (seconds)', fontsize=14)
+ax.set_title('Benchmark of Internal LLM \n with and without ChronoLog logging', fontsize=16, fontweight='bold')
 
-plt.figtext(0.5, 0.01, "100 iterations of prompts and responses", ha="center", fontsize=12)
+fig.text(0.5, 0.01, f"{report['iterations']} iterations of prompts and responses", ha="center", fontsize=12)
 
 # Annotate bars with the actual duration values
 for bar in bars:
     yval = bar.get_height()
-    plt.text(bar.get_x() + bar.get_width() / 2, yval + 0.2, f'{yval:.2f}', ha='center', va='bottom', fontsize=12)
+    ax.text(bar.get_x() + bar.get_width() / 2, yval + 0.2, f'{yval:.2f}', ha='center', va='bottom', fontsize=12)
 
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout(rect=[0, 0.03, 1, 1])  # Adjust layout to make room for the figtext
+ax.grid(axis='y', linestyle='--', alpha=0.7)
+fig.tight_layout(rect=[0, 0.03, 1, 1])  # Adjust layout to make room for the figtext
 
 # Save the graph as a PNG image and display it
-plt.savefig("graphs/internal_benchmark_comparison.png")
+fig.savefig("graphs/internal_benchmark_comparison.png")
 plt.show()
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+import matplotlib.pyplot as plt
+
+# --- Results written by benchmark_log_event.py ---
+LOG_EVENT_RESULTS = "results/log_event_benchmark.json"
+
+
+def load_results(path):
+    """Load a benchmark JSON file, or return None if it has not been produced yet."""
+    if not os.path.exists(path):
+        print(f"{path} not found; run the matching benchmark first.")
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def plot_log_event(ax, report):
+    """Plot log_event throughput (MB/s with 95% CI) against payload size on `ax`."""
+    results = report["results"]
+    labels = [r["label"] for r in results]
+    mb_per_s = [r["mb_per_s"]["mean"] for r in results]
+    # A single trial has no confidence interval (stored as null)
+    ci = [r["mb_per_s"]["ci95"] or 0.0 for r in results]
+    bars = ax.bar(labels, mb_per_s, yerr=ci, capsize=6, color='mediumpurple', edgecolor='black')
+    for bar, r in zip(bars, results):
+        ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height(),
+                f"{r['events_per_s']['mean']:.0f} ev/s", ha='center', va='bottom', fontsize=10)
+    ax.set_xlabel('Payload size', fontsize=14)
+    ax.set_ylabel('Throughput (MB/s)', fontsize=14)
+    ax.set_title(f"story.log_event throughput\n({report['trials']} trials, 95% CI)",
+                 fontsize=16, fontweight='bold')
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+
+def main():
+    report = load_results(sys.argv[1] if len(sys.argv) > 1 else LOG_EVENT_RESULTS)
+    if report is None:
+        return
+    fig, ax = plt.subplots(figsize=(8, 6))
+    plot_log_event(ax, report)
+    fig.tight_layout()
+    fig.savefig("graphs/log_event_throughput.png")
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# Snapshot written at exit when set; a .json suffix selects JSON, anything
+# else the Prometheus text format
+METRICS_FILE = os.getenv("CHRONOAI_METRICS_FILE")
+PREFIX = "chronoai"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; `observe` is a bisect and a few adds under a lock."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside its bucket."""
+        with self._lock:
+            counts, total, top = list(self.counts), self.count, self.max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = min(self.buckets[i] if i < len(self.buckets) else top, top)
+                lo = min(lo, hi)
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return top
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "counts": list(self.counts),
+                "sum": self.sum,
+                "count": self.count,
+                "max": self.max,
+            }
+
+
+class Metrics:
+    """
+    Per-phase latency histograms plus labelled counters (bytes logged,
+    errors, cache hits, ...), exportable as Prometheus text or JSON.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self._buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, phase):
+        h = self._histograms.get(phase)
+        if h is None:
+            with self._lock:
+                h = self._histograms.setdefault(phase, Histogram(self._buckets))
+        return h
+
+    def observe(self, phase, seconds):
+        self.histogram(phase).observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block into the `name` histogram. An exception
+        escaping the block also counts as an error for that phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("errors", phase=name)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """Plain-dict copy of every histogram and counter."""
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            "timestamp": time.time(),
+            "phases": {name: h.snapshot() for name, h in sorted(histograms.items())},
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = [
+            f"# HELP {PREFIX}_phase_seconds Latency of each ChronoLog or LLM phase.",
+            f"# TYPE {PREFIX}_phase_seconds histogram",
+        ]
+        for phase, h in snap["phases"].items():
+            cumulative = 0
+            for bound, count in zip(h["buckets"] + ["+Inf"], h["counts"]):
+                cumulative += count
+                lines.append(f'{PREFIX}_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_phase_seconds_sum{{phase="{phase}"}} {h["sum"]}')
+            lines.append(f'{PREFIX}_phase_seconds_count{{phase="{phase}"}} {h["count"]}')
+        typed = set()
+        for counter in snap["counters"]:
+            name = f"{PREFIX}_{counter['name']}_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            labels = ",".join(f'{k}="{v}"' for k, v in counter["labels"].items())
+            lines.append(f"{name}{{{labels}}} {counter['value']}" if labels else f"{name} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a snapshot to `path` (JSON for *.json, Prometheus text otherwise)."""
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def format_summary(self):
+        """Short per-phase table for printing at the end of a run."""
+        snap = self.snapshot()
+        lines = [f"{'phase':<28}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+        for phase, h in snap["phases"].items():
+            hist = self._histograms[phase]
+            mean = h["sum"] / h["count"] if h["count"] else 0.0
+            lines.append(
+                f"{phase:<28}{h['count']:>8}{mean * 1e3:>10.2f}"
+                f"{hist.quantile(0.5) * 1e3:>10.2f}{hist.quantile(0.95) * 1e3:>10.2f}"
+                f"{hist.quantile(0.99) * 1e3:>10.2f}"
+            )
+        for counter in snap["counters"]:
+            labels = ",".join(f"{k}={v}" for k, v in counter["labels"].items())
+            lines.append(f"{counter['name']}{'{' + labels + '}' if labels else ''}: {counter['value']}")
+        return "\n".join(lines)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+def phase(name):
+    """Shortcut for `get_metrics().phase(name)`."""
+    return _metrics.phase(name)
+
+
+def _write_at_exit():
+    try:
+        _metrics.write(METRICS_FILE)
+    except OSError as e:
+        print(f"Could not write metrics to {METRICS_FILE}: {e}")
+
+
+# Registered at import, i.e. before any session, so it runs after them at exit
+if METRICS_FILE:
+    atexit.register(_write_at_exit)
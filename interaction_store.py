@@ -0,0 +1,216 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from wal_spool import is_spooled, parse_spooled
+
+# Local materialized copy of retrieved records; CHRONOAI_STORE overrides the path
+STORE_PATH = os.getenv("CHRONOAI_STORE", os.path.expanduser("~/.cache/chronoai/interactions.sqlite"))
+INSERT_BATCH = 1000
+
+NS_PER_SECOND = 1_000_000_000
+
+
+class InteractionStore:
+    """
+    SQLite store of records already read out of ChronoLog, per
+    chronicle/story, with a high-water mark (newest timestamp fetched) and
+    a low-water mark (everything older has been evicted).
+
+    `query` only asks the reader for events newer than the high-water mark
+    and answers the rest locally. Records that reach the archive later than
+    newer ones already synced are not picked up; run `resync` if needed.
+
+    Events replayed from a write-ahead spool are unwrapped here, and their
+    (spool id, seq) remembered, so a replay that reached ChronoLog twice is
+    stored once even when the copies are read by different syncs.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "CREATE TABLE IF NOT EXISTS records ("
+            " chronicle TEXT NOT NULL, story TEXT NOT NULL,"
+            " timestamp INTEGER NOT NULL, client_id INTEGER NOT NULL, idx INTEGER NOT NULL,"
+            " record BLOB NOT NULL,"
+            " PRIMARY KEY (chronicle, story, timestamp, client_id, idx)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " chronicle TEXT NOT NULL, story TEXT NOT NULL,"
+            " high_water INTEGER, low_water INTEGER NOT NULL DEFAULT 0, updated REAL,"
+            " PRIMARY KEY (chronicle, story));"
+            "CREATE TABLE IF NOT EXISTS spooled ("
+            " chronicle TEXT NOT NULL, story TEXT NOT NULL, spool_id BLOB NOT NULL, seq INTEGER NOT NULL,"
+            " timestamp INTEGER NOT NULL,"
+            " PRIMARY KEY (chronicle, story, spool_id, seq)) WITHOUT ROWID;"
+        )
+        self._db.commit()
+
+    def watermarks(self, chronicle: str, story: str) -> tuple[Optional[int], int]:
+        """Return (high_water, low_water) for a story; high_water is None before the first sync."""
+        row = self._db.execute(
+            "SELECT high_water, low_water FROM watermarks WHERE chronicle = ? AND story = ?",
+            (chronicle, story),
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def add_records(self, chronicle: str, story: str,
+                    records: Iterable[tuple[int, int, int, bytes]],
+                    incomplete: Optional[list] = None) -> int:
+        """
+        Insert (timestamp, client_id, index, record) tuples and advance the
+        high-water mark. Duplicates, including second copies of replayed
+        events, are ignored.
+
+        `incomplete` holds timestamps of events the reader could not finish
+        yet (fragmented events still being logged); once `records` is
+        consumed, the high-water mark stays below the oldest of them so the
+        next sync reads them again.
+
+        Returns:
+            int: Number of records offered.
+        """
+        count = 0
+        newest = None
+        with self._lock:
+            batch = []
+            for ts, client_id, index, record in records:
+                newest = ts if newest is None or ts > newest else newest
+                if is_spooled(record):
+                    spool_id, seq, _, record = parse_spooled(record)
+                    if not self._db.execute(
+                            "INSERT OR IGNORE INTO spooled (chronicle, story, spool_id, seq, timestamp) "
+                            "VALUES (?, ?, ?, ?, ?)", (chronicle, story, spool_id, seq, ts)).rowcount:
+                        continue
+                if isinstance(record, str):
+                    record = record.encode("utf-8")
+                batch.append((chronicle, story, ts, client_id, index, record))
+                if len(batch) >= INSERT_BATCH:
+                    self._insert(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._insert(batch)
+                count += len(batch)
+            if incomplete and newest is not None:
+                newest = min(newest, min(incomplete) - 1)
+            if newest is not None:
+                self._db.execute(
+                    "INSERT INTO watermarks (chronicle, story, high_water, updated) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (chronicle, story) DO UPDATE SET "
+                    " high_water = MAX(COALESCE(high_water, 0), excluded.high_water),"
+                    " updated = excluded.updated",
+                    (chronicle, story, newest, time.time()),
+                )
+            self._db.commit()
+        return count
+
+    def _insert(self, batch):
+        self._db.executemany(
+            "INSERT OR IGNORE INTO records (chronicle, story, timestamp, client_id, idx, record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+
+    def sync(self, reader, chronicle: str, story: str, end_time: Optional[int] = None) -> int:
+        """
+        Fetch events newer than the high-water mark (up to `end_time`) from
+        `reader` into the store.
+
+        Returns:
+            int: Number of records fetched.
+        """
+        high_water, low_water = self.watermarks(chronicle, story)
+        start = max(high_water + 1, low_water) if high_water is not None else low_water
+        if end_time is not None and start > end_time:
+            return 0
+        incomplete = []
+        records = reader.read_story(chronicle, story, start, end_time, incomplete=incomplete, unwrap=False)
+        return self.add_records(chronicle, story, records, incomplete)
+
+    def resync(self, reader, chronicle: str, story: str, end_time: Optional[int] = None) -> int:
+        """Re-read everything above the low-water mark, filling in late arrivals."""
+        _, low_water = self.watermarks(chronicle, story)
+        records = reader.read_story(chronicle, story, low_water, end_time, unwrap=False)
+        return self.add_records(chronicle, story, records)
+
+    def records(self, chronicle: str, story: str, start_time: int = 0,
+                end_time: Optional[int] = None) -> Iterator[tuple[int, int, int, bytes]]:
+        """Stored records in [start_time, end_time], oldest first."""
+        sql = ("SELECT timestamp, client_id, idx, record FROM records "
+               "WHERE chronicle = ? AND story = ? AND timestamp >= ?")
+        params = [chronicle, story, start_time]
+        if end_time is not None:
+            sql += " AND timestamp <= ?"
+            params.append(end_time)
+        sql += " ORDER BY timestamp, client_id, idx"
+        for ts, client_id, index, record in self._db.execute(sql, params):
+            yield ts, client_id, index, bytes(record)
+
+    def records_at(self, chronicle: str, story: str,
+                   keys: Iterable[tuple[int, int, int]]) -> Iterator[tuple[int, int, int, bytes]]:
+        """Stored records with the given (timestamp, client_id, index) keys, oldest first."""
+        sql = ("SELECT record FROM records WHERE chronicle = ? AND story = ? "
+               "AND timestamp = ? AND client_id = ? AND idx = ?")
+        for ts, client_id, index in sorted(set(keys)):
+            row = self._db.execute(sql, (chronicle, story, ts, client_id, index)).fetchone()
+            if row is not None:
+                yield ts, client_id, index, bytes(row[0])
+
+    def query(self, reader, chronicle: str, story: str, start_time: int = 0,
+              end_time: Optional[int] = None) -> Iterator[tuple[int, int, int, bytes]]:
+        """
+        Answer a range query, syncing only what is newer than the high-water
+        mark. Ranges reaching below the low-water mark go to the reader.
+        """
+        high_water, low_water = self.watermarks(chronicle, story)
+        if start_time < low_water:
+            yield from reader.read_story(chronicle, story, start_time, end_time)
+            return
+        if high_water is None or end_time is None or end_time > high_water:
+            self.sync(reader, chronicle, story, end_time)
+        yield from self.records(chronicle, story, start_time, end_time)
+
+    def evict_older_than(self, max_age_seconds: float, chronicle: Optional[str] = None,
+                         story: Optional[str] = None) -> int:
+        """
+        Drop records older than `max_age_seconds` (optionally for one story)
+        and raise the low-water marks accordingly.
+
+        Returns:
+            int: Number of records removed.
+        """
+        cutoff = time.time_ns() - int(max_age_seconds * NS_PER_SECOND)
+        scope, scope_params = "", []
+        if chronicle is not None:
+            scope += " AND chronicle = ?"
+            scope_params.append(chronicle)
+        if story is not None:
+            scope += " AND story = ?"
+            scope_params.append(story)
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM records WHERE timestamp < ?" + scope, [cutoff] + scope_params
+            ).rowcount
+            self._db.execute("DELETE FROM spooled WHERE timestamp < ?" + scope, [cutoff] + scope_params)
+            self._db.execute(
+                "UPDATE watermarks SET low_water = MAX(low_water, ?) WHERE 1" + scope,
+                [cutoff] + scope_params,
+            )
+            self._db.commit()
+        return removed
+
+    def compact(self):
+        """Reclaim space left by evictions."""
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._db.execute("VACUUM")
+            self._db.execute("ANALYZE")
+
+    def close(self):
+        self._db.close()
@@ -1,70 +1,198 @@
 import os
 import time
-import requests
-import py_chronolog_client
-
-def prompt_ollama(model, prompt, server_url='http://localhost:11434'):
-    url = f'{server_url}/api/generate'
-    data = {
-        'model': model,
-        'prompt': prompt,
-        'stream': False
-    }
-    response = requests.post(url, json=data)
-    if response.status_code == 200:
-        result = response.json()
-        return result.get('response', '').strip()
-    else:
-        print(f"Request failed: {response.status_code}: {response.text}")
-        return None
+from contextlib import closing
+from chronolog_session import get_session
+from log_writer import get_writer
+from llm_cache import cached_completion, get_cache, make_key
+from event_codec import encode_event
+from instrumentation import get_metrics, phase
+from llm_client import OLLAMA_URL, LLMError, get_ollama_client
+
+# Seconds between partial-response events while streaming in main()
+PARTIAL_LOG_INTERVAL = 5.0
+
+def prompt_ollama(model, prompt, server_url=None, stream=False, stats=None, use_cache=True):
+    """
+    Send a prompt to Ollama through the shared pooled client and return the
+    response text, or None if the request failed. `server_url` defaults to
+    OLLAMA_HOST (http://localhost:11434).
+    """
+    messages = [{"role": "user", "content": prompt}]
+
+    def call():
+        if stream:
+            call_stats = stats if stats is not None else {}
+            tokens = list(stream_ollama(model, prompt, server_url, stats=call_stats, use_cache=False))
+            if call_stats.get("error"):
+                return None
+            return "".join(tokens).strip()
+
+        try:
+            with phase("ollama_generate"):
+                return get_ollama_client(server_url).complete(model, messages, stats=stats)
+        except LLMError as e:
+            print(e)
+            return None
+
+    return cached_completion(model, None, messages, call, stats=stats, use_cache=use_cache,
+                             endpoint=(server_url or OLLAMA_URL).rstrip("/"))
+
+def stream_ollama(model, prompt, server_url=None, stats=None,
+                  log_to=None, log_interval=None, use_cache=True):
+    """
+    Streams a generation from Ollama and yields tokens as they arrive.
+
+    Args:
+        model (str): The Ollama model name.
+        prompt (str): The user's prompt.
+        server_url (str): Base URL of the Ollama server (default OLLAMA_HOST).
+        stats (dict): If given, filled with `time_to_first_token`, `total_time`,
+            `tokens`, `tokens_per_second`, `latency` (seconds) and
+            `prompt_tokens`/`completion_tokens` once the stream ends.
+        log_to (tuple): Optional (chronicle, story) that receives the partial
+            response every `log_interval` seconds while generation runs.
+        log_interval (float): Seconds between partial-response events.
+        use_cache (bool): Serve a cached response as a single chunk when one
+            exists (`stats["cached"]` is set), and cache completed streams.
+
+    Yields:
+        str: Each token chunk in generation order.
+    """
+    cache = get_cache() if use_cache else None
+    key = make_key(model, None, [{"role": "user", "content": prompt}],
+                   (server_url or OLLAMA_URL).rstrip("/")) if cache is not None else None
+    cached = cache.get(key) if cache is not None else None
+    if cache is not None:
+        get_metrics().inc("cache_hits" if cached is not None else "cache_misses")
+    if cached is not None:
+        if stats is not None:
+            stats.update({
+                "cached": True,
+                "time_to_first_token": 0.0,
+                "total_time": 0.0,
+                "tokens": 0,
+                "tokens_per_second": 0.0,
+                "latency": 0.0,
+            })
+        yield cached
+        return
+
+    writer = get_writer() if log_to and log_interval else None
+    partial = []
+    tokens = 0
+    eval_count = eval_duration = prompt_eval_count = None
+    first_token_at = None
+    finished = False
+    start = last_log = time.perf_counter()
+
+    try:
+        chunks = get_ollama_client(server_url).stream(model, [{"role": "user", "content": prompt}])
+    except LLMError as e:
+        get_metrics().inc("errors", phase="ollama_stream")
+        print(e)
+        if stats is not None:
+            stats["error"] = e.status or "connection"
+        return
+
+    with closing(chunks):
+        for chunk in chunks:
+            token = chunk.get('response', '')
+            if token:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens += 1
+                if writer is not None or cache is not None:
+                    partial.append(token)
+                yield token
+            if chunk.get('done'):
+                finished = True
+                eval_count = chunk.get('eval_count')
+                eval_duration = chunk.get('eval_duration')
+                prompt_eval_count = chunk.get('prompt_eval_count')
+                break
+            if writer is not None and time.perf_counter() - last_log >= log_interval:
+                last_log = time.perf_counter()
+                writer.submit(log_to[0], log_to[1],
+                              encode_event(prompt, "".join(partial), model=model,
+                                           latency=last_log - start, extra={"partial": True}))
+
+    if cache is not None and finished and partial:
+        cache.put(key, "".join(partial).strip())
+
+    end = time.perf_counter()
+    metrics = get_metrics()
+    metrics.observe("ollama_stream", end - start)
+    if first_token_at is not None:
+        metrics.observe("ollama_time_to_first_token", first_token_at - start)
+
+    if stats is not None:
+        tokens = eval_count or tokens
+        if eval_duration:
+            # Ollama reports its own generation time in nanoseconds
+            tokens_per_second = tokens / (eval_duration / 1e9)
+        else:
+            gen_time = end - (first_token_at or start)
+            tokens_per_second = tokens / gen_time if gen_time > 0 else 0.0
+        stats.update({
+            "cached": False,
+            "time_to_first_token": (first_token_at or end) - start,
+            "total_time": end - start,
+            "tokens": tokens,
+            "tokens_per_second": tokens_per_second,
+            "latency": end - start,
+            "prompt_tokens": prompt_eval_count,
+            "completion_tokens": tokens,
+        })
 
 def main():
     # --- ChronoLog Client Setup ---
     print("Connecting to ChronoLog...")
-    clientConf = py_chronolog_client.ClientPortalServiceConf("ofi+sockets", "127.0.0.1", 5555, 55)
-    client = py_chronolog_client.Client(clientConf)
-    
-    return_code = client.Connect()
-    print("client.Connect() returns:", return_code)
-    
-    attrs = dict()
-    return_code = client.CreateChronicle("chronicle_llama", attrs, 1)
-    print("client.CreateChronicle() returns:", return_code)
-    
-    return_tuple = client.AcquireStory("chronicle_llama", "story_llama", attrs, 1)
-    print("client.AcquireStory() returns:", return_tuple)
-    
-    if return_tuple[0] != 0:
-        print("Failed to acquire story. Exiting.")
-        return
-    story = return_tuple[1]
+    session = get_session()
+    try:
+        session.get_story("chronicle_llama", "story_llama")
+    except RuntimeError as e:
+        # Events are spooled locally and replayed once ChronoLog is back
+        print(f"Failed to acquire story ({e}). Continuing; events will be spooled.")
+    writer = get_writer()
 
     # --- Loop to Send 100 Prompts and Log Responses ---
     for i in range(1, 101):
         prompt = f"Test prompt {i}: Tell me something interesting about the number {i} in short."
         print(f"\nSending prompt {i}: {prompt}")
-        response = prompt_ollama("llama3.2", prompt)
+        print("Received response:")
+        stats = {}
+        tokens = []
+        for token in stream_ollama("llama3.2", prompt, stats=stats,
+                                   log_to=("chronicle_llama", "story_llama"),
+                                   log_interval=PARTIAL_LOG_INTERVAL):
+            print(token, end="", flush=True)
+            tokens.append(token)
+        response = "".join(tokens).strip()
         
-        if response:
-            print("Received response:")
-            print(response)
+        if stats.get("cached"):
+            print("\n[served from cache]")
+        elif response:
+            print(f"\n[time to first token: {stats['time_to_first_token']:.2f}s, "
+                  f"{stats['tokens_per_second']:.1f} tokens/s]")
         else:
             response = "No response received due to an error."
         
-        # Combine prompt and response into one log message
-        log_message = f"Prompt: {prompt}\nResponse: {response}"
-        print("Logging event to ChronoLog...")
-        story.log_event(log_message)
-        
-        # Optional pause to avoid overwhelming the server.
-        time.sleep(1)
+        # Log prompt, response and call metadata as one event
+        log_message = encode_event(
+            prompt, response,
+            model="llama3.2",
+            latency=stats.get("latency"),
+            prompt_tokens=stats.get("prompt_tokens"),
+            completion_tokens=stats.get("completion_tokens"),
+            source="cache" if stats.get("cached") else "llm",
+        )
+        print("Queueing event for ChronoLog...")
+        writer.submit("chronicle_llama", "story_llama", log_message)
 
     # --- Clean Up ChronoLog Client ---
-    return_code = client.ReleaseStory("chronicle_llama", "story_llama")
-    print("\nclient.ReleaseStory() returns:", return_code)
-    
-    return_code = client.Disconnect()
-    print("client.Disconnect() returns:", return_code)
+    writer.close()
+    print("\nWritten events:", writer.written, "failed:", writer.failed)
+    session.close()
 
 if __name__ == "__main__":
     main()
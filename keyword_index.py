@@ -0,0 +1,313 @@
+import json
+import os
+import re
+import shlex
+import struct
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Optional
+
+from event_codec import event_text
+
+# Where keyword indexes live; CHRONOAI_KEYWORD_DIR overrides it
+INDEX_DIR = os.getenv("CHRONOAI_KEYWORD_DIR", os.path.expanduser("~/.cache/chronoai/keyword"))
+SEGMENT_MAGIC = b"KWI2"
+# Merge into a single segment once this many have accumulated
+MAX_SEGMENTS = 16
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def encode_varints(values: Iterable[int], out: bytearray):
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+
+
+def decode_varints(data: bytes, count: int, pos: int = 0) -> tuple[list[int], int]:
+    values = []
+    for _ in range(count):
+        shift = result = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        values.append(result)
+    return values, pos
+
+
+def write_segment(path: str, postings: dict[str, dict[tuple, list[int]]]):
+    """
+    Write one immutable segment. Postings are keyed by event, i.e.
+    (timestamp, client_id, index). Each term stores a block of events
+    (delta-encoded timestamp, client id, index) followed by a block of
+    delta-encoded word positions, so queries that need no positions never
+    decode them.
+    """
+    blob = bytearray()
+    terms = {}
+    min_ts = max_ts = None
+    for term in sorted(postings):
+        docs = postings[term]
+        keys = sorted(docs)
+        offset = len(blob)
+        prev = 0
+        for ts, client_id, index in keys:
+            encode_varints([ts - prev, client_id, index], blob)
+            prev = ts
+        keys_len = len(blob) - offset
+        for key in keys:
+            positions = docs[key]
+            encode_varints([len(positions)], blob)
+            encode_varints([p - q for p, q in zip(positions, [0] + positions[:-1])], blob)
+        terms[term] = [offset, keys_len, len(blob) - offset - keys_len, len(keys)]
+        min_ts = keys[0][0] if min_ts is None else min(min_ts, keys[0][0])
+        max_ts = keys[-1][0] if max_ts is None else max(max_ts, keys[-1][0])
+
+    header = json.dumps({"terms": terms, "min_ts": min_ts, "max_ts": max_ts}).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(SEGMENT_MAGIC + struct.pack("<I", len(header)) + header + bytes(blob))
+    os.replace(tmp, path)
+
+
+class Segment:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a keyword index segment")
+        (header_len,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(data[8:8 + header_len])
+        self.path = path
+        self.terms = header["terms"]
+        self.min_ts = header["min_ts"]
+        self.max_ts = header["max_ts"]
+        self.blob = memoryview(data)[8 + header_len:]
+
+    def overlaps(self, start_time: int, end_time: Optional[int]) -> bool:
+        if self.min_ts is None:
+            return False
+        return self.max_ts >= start_time and (end_time is None or self.min_ts <= end_time)
+
+    def keys(self, term: str) -> list[tuple[int, int, int]]:
+        """(timestamp, client_id, index) of the events containing `term`, in order."""
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        offset, _, _, df = entry
+        values, _ = decode_varints(self.blob, 3 * df, offset)
+        out, acc = [], 0
+        for i in range(0, len(values), 3):
+            acc += values[i]
+            out.append((acc, values[i + 1], values[i + 2]))
+        return out
+
+    def positions(self, term: str) -> dict[tuple, list[int]]:
+        entry = self.terms.get(term)
+        if entry is None:
+            return {}
+        offset, keys_len, _, df = entry
+        keys = self.keys(term)
+        pos = offset + keys_len
+        out = {}
+        for key in keys:
+            (n,), pos = decode_varints(self.blob, 1, pos)
+            deltas, pos = decode_varints(self.blob, n, pos)
+            acc, positions = 0, []
+            for d in deltas:
+                acc += d
+                positions.append(acc)
+            out[key] = positions
+        return out
+
+
+def parse_query(query: str) -> list[list[list[str]]]:
+    """
+    Parse `a b AND "c d" OR e` into OR-groups of AND-clauses; each clause is
+    a list of terms (more than one term means a phrase).
+
+    Raises:
+        ValueError: If a quote is not closed.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError as e:
+        raise ValueError(f"Invalid query {query!r}: {e}") from None
+    groups, clauses = [], []
+    for token in tokens:
+        if token == "OR":
+            if clauses:
+                groups.append(clauses)
+            clauses = []
+        elif token == "AND":
+            continue
+        else:
+            terms = tokenize(token)
+            if terms:
+                clauses.append(terms)
+    if clauses:
+        groups.append(clauses)
+    return groups
+
+
+class KeywordIndex:
+    """
+    On-disk inverted index (term -> events) for one
+    chronicle/story, built incrementally from retrieved records as a list
+    of immutable segments that are merged once there are too many.
+    """
+
+    def __init__(self, chronicle: str, story: str, index_dir: str = INDEX_DIR):
+        self.dir = os.path.join(index_dir, f"{chronicle}.{story}")
+        os.makedirs(self.dir, exist_ok=True)
+        self.state_path = os.path.join(self.dir, "state.json")
+        self.state = {"watermark": None, "segments": [], "next_segment": 0}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        try:
+            self.segments = [Segment(os.path.join(self.dir, name)) for name in self.state["segments"]]
+        except ValueError as e:
+            # Written by an older format; start over, add() rebuilds it from the store
+            print(f"Rebuilding keyword index {self.dir}: {e}")
+            for name in self.state["segments"]:
+                os.remove(os.path.join(self.dir, name))
+            self.state = {"watermark": None, "segments": [], "next_segment": self.state["next_segment"]}
+            self._save_state()
+            self.segments = []
+
+    @property
+    def watermark(self) -> Optional[int]:
+        """Newest event timestamp indexed so far."""
+        return self.state["watermark"]
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def _new_segment(self, postings) -> Segment:
+        name = f"seg-{self.state['next_segment']:06d}.kwi"
+        self.state["next_segment"] += 1
+        write_segment(os.path.join(self.dir, name), postings)
+        return Segment(os.path.join(self.dir, name))
+
+    def add(self, records: Iterable[tuple[int, int, int, str]]) -> int:
+        """
+        Index (timestamp, client_id, index, record) tuples as one new segment.
+        Binary events are indexed on their prompt and response text.
+
+        Returns:
+            int: Number of records indexed.
+        """
+        postings: dict[str, dict[tuple, list[int]]] = {}
+        newest = self.watermark
+        count = 0
+        for ts, client_id, index, text in records:
+            if not isinstance(text, str):
+                text = event_text(text)
+            key = (ts, client_id, index)
+            for i, term in enumerate(tokenize(text)):
+                postings.setdefault(term, {}).setdefault(key, []).append(i)
+            newest = ts if newest is None or ts > newest else newest
+            count += 1
+        if not count:
+            return 0
+
+        segment = self._new_segment(postings)
+        self.segments.append(segment)
+        self.state["segments"].append(os.path.basename(segment.path))
+        self.state["watermark"] = newest
+        self._save_state()
+        if len(self.segments) > MAX_SEGMENTS:
+            self.merge()
+        return count
+
+    def merge(self):
+        """Rewrite all segments as one."""
+        postings: dict[str, dict[tuple, list[int]]] = {}
+        for segment in self.segments:
+            for term in segment.terms:
+                docs = postings.setdefault(term, {})
+                for key, positions in segment.positions(term).items():
+                    docs.setdefault(key, []).extend(positions)
+        for docs in postings.values():
+            for positions in docs.values():
+                positions.sort()
+        old = [s.path for s in self.segments]
+        merged = self._new_segment(postings)
+        self.segments = [merged]
+        self.state["segments"] = [os.path.basename(merged.path)]
+        self._save_state()
+        for path in old:
+            os.remove(path)
+
+    def _term_keys(self, term, segments) -> set[tuple]:
+        out = set()
+        for segment in segments:
+            out.update(segment.keys(term))
+        return out
+
+    def _phrase_keys(self, terms, segments) -> set[tuple]:
+        candidates = None
+        for term in terms:
+            found = self._term_keys(term, segments)
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return set()
+        positions = []
+        for term in terms:
+            merged: dict[tuple, set[int]] = {}
+            for segment in segments:
+                for key, pos in segment.positions(term).items():
+                    if key in candidates:
+                        merged.setdefault(key, set()).update(pos)
+            positions.append(merged)
+        matches = set()
+        for key in candidates:
+            starts = positions[0].get(key, set())
+            for i in range(1, len(terms)):
+                starts = {p for p in starts if p + i in positions[i].get(key, ())}
+                if not starts:
+                    break
+            if starts:
+                matches.add(key)
+        return matches
+
+    def search(self, query: str, start_time: int = 0,
+               end_time: Optional[int] = None) -> list[tuple[int, int, int]]:
+        """
+        (timestamp, client_id, index) of the events matching `query` within
+        [start_time, end_time], oldest first.
+
+        Terms next to each other (or joined by AND) must all occur, OR
+        separates alternatives, and "quoted words" must occur as a phrase.
+
+        Raises:
+            ValueError: If the query has an unclosed quote.
+        """
+        segments = [s for s in self.segments if s.overlaps(start_time, end_time)]
+        result: set[tuple] = set()
+        for clauses in parse_query(query):
+            group = None
+            for terms in clauses:
+                found = (self._term_keys(terms[0], segments) if len(terms) == 1
+                         else self._phrase_keys(terms, segments))
+                group = found if group is None else group & found
+                if not group:
+                    break
+            result |= group or set()
+        keys = sorted(result)
+        lo = bisect_left(keys, (start_time,))
+        hi = bisect_right(keys, (end_time, float("inf"))) if end_time is not None else len(keys)
+        return keys[lo:hi]
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import get_metrics
+
+# Defaults; CHRONOAI_CACHE_DIR moves the on-disk tier, CHRONOAI_CACHE=0 disables caching
+CACHE_DIR = os.getenv("CHRONOAI_CACHE_DIR", os.path.expanduser("~/.cache/chronoai"))
+MAX_MEMORY_ENTRIES = 1024
+MAX_DISK_ENTRIES = 100000
+TTL_SECONDS = 7 * 24 * 3600
+
+
+def make_key(model, temperature, messages, endpoint=None):
+    """
+    Stable cache key for one completion request. `endpoint` is the API base
+    URL, so replies from one server (e.g. mock_llm_server.py) are never
+    served for requests to another.
+    """
+    payload = json.dumps(
+        {"endpoint": endpoint, "model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier prompt/response cache: an in-memory LRU in front of a SQLite
+    file that survives restarts. Entries older than `ttl` seconds are
+    treated as misses, and both tiers evict least recently used entries
+    once they exceed their size bound.
+    """
+
+    def __init__(self, disk_path=None, max_entries=MAX_MEMORY_ENTRIES,
+                 max_disk_entries=MAX_DISK_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts_since_trim = 0
+
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._db.commit()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = json.loads(row[0]), row[1]
+                    if not self._expired(created, now):
+                        self._db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, value, created)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store `value` in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                self._puts_since_trim += 1
+                # Trimming costs a COUNT, so only do it every so often
+                if self._puts_since_trim >= 100:
+                    self._trim_disk()
+                self._db.commit()
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _trim_disk(self):
+        self._puts_since_trim = 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide cache, or None if CHRONOAI_CACHE=0.
+    """
+    global _cache
+    if os.getenv("CHRONOAI_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(disk_path=os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+    return _cache
+
+
+def cached_completion(model, temperature, messages, call, stats=None, use_cache=True, endpoint=None):
+    """
+    Return the cached response for (endpoint, model, temperature, messages), or run
+    `call()` and cache its result. `stats["cached"]` records which one happened
+    and `stats["latency"]` how long it took in seconds.
+    """
+    start = time.perf_counter()
+    cache = get_cache() if use_cache else None
+    key = make_key(model, temperature, messages, endpoint) if cache is not None else None
+    if cache is not None:
+        value = cache.get(key)
+        if value is not None:
+            get_metrics().inc("cache_hits")
+            if stats is not None:
+                stats["cached"] = True
+                stats["latency"] = time.perf_counter() - start
+            return value
+        get_metrics().inc("cache_misses")
+
+    value = call()
+    if cache is not None and value is not None:
+        cache.put(key, value)
+    if stats is not None:
+        stats["cached"] = False
+        stats["latency"] = time.perf_counter() - start
+    return value
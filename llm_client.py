@@ -0,0 +1,268 @@
+import abc
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import get_metrics
+from rate_scheduler import get_scheduler
+
+# --- Defaults, overridable per client ---
+OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = float(os.getenv("CHRONOAI_LLM_TIMEOUT", 120.0))
+MAX_RETRIES = 3
+# Full-jitter exponential backoff: sleep uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+# Keep-alive connections kept per host
+POOL_SIZE = 32
+
+# Statuses worth retrying; anything else is returned to the caller as an error
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    """An LLM request failed; `status` is the HTTP status, or None for network errors."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMClient(abc.ABC):
+    """
+    Base for provider clients: one pooled keep-alive `requests.Session` per
+    client, (connect, read) timeouts, and retries with jittered exponential
+    backoff on connection errors and retryable statuses (honouring
+    Retry-After). Every attempt goes through the provider's shared
+    AdaptiveScheduler, which paces requests to what the backend sustains.
+
+    Subclasses implement `complete(model, messages, temperature, stats)`,
+    which returns the response text and fills `stats["prompt_tokens"]` and
+    `stats["completion_tokens"]` when the provider reports them.
+    """
+
+    provider = "llm"
+
+    def __init__(self, base_url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES, pool_size=POOL_SIZE, headers=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    def post(self, path, payload, stream=False):
+        """
+        POST JSON to `path` and return the response once it has a 2xx
+        status, retrying as configured. A streamed response keeps its
+        scheduler slot until it is closed.
+
+        Raises:
+            LLMError: If the request still fails after the last retry.
+        """
+        url = f"{self.base_url}{path}"
+        scheduler = get_scheduler(self.provider)
+        attempt = 0
+        while True:
+            retry_after = None
+            started = scheduler.acquire() if scheduler is not None else None
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if scheduler is not None:
+                    scheduler.release(started)
+                error = LLMError(f"{self.provider} request to {url} failed: {e}")
+            else:
+                if scheduler is not None:
+                    if stream and response.status_code < 300:
+                        self._release_on_close(response, scheduler, started)
+                        return response
+                    scheduler.release(started, response.status_code, response.headers.get("Retry-After"))
+                if response.status_code < 300:
+                    return response
+                error = LLMError(f"{self.provider} request failed: {response.status_code}: {response.text[:500]}",
+                                 response.status_code)
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    raise error
+            if attempt >= self.max_retries:
+                raise error
+            get_metrics().inc("retries", provider=self.provider)
+            time.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    @staticmethod
+    def _release_on_close(response, scheduler, started):
+        """
+        Hold a streamed response's scheduler slot until the response is
+        closed, or garbage-collected without being closed.
+        """
+        latency = time.monotonic() - started
+        status, retry_after = response.status_code, response.headers.get("Retry-After")
+        close = response.close
+        released = threading.Lock()
+
+        def release():
+            if released.acquire(blocking=False):
+                scheduler.release(started, status, retry_after, latency=latency)
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+
+        response.close = close_and_release
+        weakref.finalize(response, release)
+
+    @abc.abstractmethod
+    def complete(self, model, messages, temperature=None, stats=None) -> str:
+        """Send `messages` to `model` and return the response text."""
+
+    def close(self):
+        self.session.close()
+
+
+class OllamaClient(LLMClient):
+    """Ollama's /api/generate, blocking or as an NDJSON stream."""
+
+    provider = "ollama"
+
+    def __init__(self, base_url=OLLAMA_URL, **kwargs):
+        super().__init__(base_url, **kwargs)
+
+    @staticmethod
+    def _payload(model, messages, temperature, stream):
+        system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        prompt = "\n\n".join(m["content"] for m in messages if m["role"] != "system")
+        payload = {"model": model, "prompt": prompt, "stream": stream}
+        if system:
+            payload["system"] = system
+        if temperature is not None:
+            payload["options"] = {"temperature": temperature}
+        return payload
+
+    def complete(self, model, messages, temperature=None, stats=None) -> str:
+        result = self.post("/api/generate", self._payload(model, messages, temperature, False)).json()
+        if stats is not None:
+            stats["prompt_tokens"] = result.get("prompt_eval_count")
+            stats["completion_tokens"] = result.get("eval_count")
+        return result.get("response", "").strip()
+
+    def stream(self, model, messages, temperature=None) -> Iterator[dict]:
+        """
+        Start a streamed generation and return an iterator over its parsed
+        NDJSON chunks. The request (and any retries) happens here, so errors
+        surface before the first chunk; the connection goes back to the pool
+        when the iterator is exhausted or closed.
+
+        Raises:
+            LLMError: If the request fails.
+        """
+        response = self.post("/api/generate", self._payload(model, messages, temperature, True), stream=True)
+        return self._chunks(response)
+
+    @staticmethod
+    def _chunks(response):
+        return _Chunks(response)
+
+
+class _Chunks:
+    """
+    Parsed NDJSON chunks of a streamed response. The response is closed
+    when the chunks run out, on `close()`, or when the iterator is dropped,
+    even if it was never iterated.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self._lines = response.iter_lines()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        try:
+            for line in self._lines:
+                if line:
+                    return json.loads(line)
+        except BaseException:
+            self.close()
+            raise
+        self.close()
+        raise StopIteration
+
+    def close(self):
+        self._response.close()
+
+    def __del__(self):
+        self.close()
+
+
+class OpenAIClient(LLMClient):
+    """OpenAI-compatible /chat/completions over plain HTTP."""
+
+    provider = "openai"
+
+    def __init__(self, base_url=OPENAI_BASE_URL, api_key=None, **kwargs):
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else None
+        super().__init__(base_url, headers=headers, **kwargs)
+
+    def complete(self, model, messages, temperature=None, stats=None) -> str:
+        payload = {"model": model, "messages": messages}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        result = self.post("/chat/completions", payload).json()
+        usage = result.get("usage") or {}
+        if stats is not None:
+            stats["prompt_tokens"] = usage.get("prompt_tokens")
+            stats["completion_tokens"] = usage.get("completion_tokens")
+        return result["choices"][0]["message"]["content"].strip()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(cls, base_url):
+    key = (cls, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = cls(base_url)
+    return client
+
+
+def get_ollama_client(base_url: Optional[str] = None) -> OllamaClient:
+    """Return the shared Ollama client for `base_url` (default OLLAMA_HOST)."""
+    return _get_client(OllamaClient, base_url or OLLAMA_URL)
+
+
+def get_openai_client(base_url: Optional[str] = None) -> OpenAIClient:
+    """Return the shared OpenAI client for `base_url` (default OPENAI_BASE_URL)."""
+    return _get_client(OpenAIClient, base_url or OPENAI_BASE_URL)
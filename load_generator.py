@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chronolog_session import get_session
+from log_writer import get_writer
+from external_llm import chat_with_gpt
+from internal_llm import prompt_ollama
+from mock_llm_server import start_mock_server
+from instrumentation import get_metrics
+import rate_scheduler
+
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list (p in 0..100).
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_latencies(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+class Pacer:
+    """
+    Spreads request start times evenly so all clients together stay at
+    `rate` requests per second. A rate of 0 means no pacing.
+    """
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.perf_counter()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_infer(provider, model, url, use_cache=False):
+    """Return a prompt -> response function for the selected provider."""
+    if provider == "ollama":
+        return lambda prompt: prompt_ollama(model, prompt, server_url=url, use_cache=use_cache)
+    # A url points the OpenAI client at a compatible server, e.g. mock_llm_server.py
+    base_url = f"{url}/v1" if url else None
+    return lambda prompt: chat_with_gpt(prompt, model=model, use_cache=use_cache, base_url=base_url)
+
+
+def run_load(args):
+    infer = make_infer(args.provider, args.model, args.url, use_cache=args.use_cache)
+    pacer = Pacer(args.rate)
+    session = None if args.log_mode == "none" else get_session()
+    writer = get_writer() if args.log_mode == "async" else None
+
+    def story_for(client_id):
+        if args.story_mode == "shared":
+            return args.story
+        return f"{args.story}_{client_id}"
+
+    if session is not None:
+        # Acquire stories up front so setup is not part of the measured latency
+        for client_id in range(args.clients):
+            session.get_story(args.chronicle, story_for(client_id))
+
+    counter = iter(range(1, args.requests + 1))
+    counter_lock = threading.Lock()
+    results_lock = threading.Lock()
+    inference, scheduling, logging, total = [], [], [], []
+    errors = [0]
+
+    def client_loop(client_id):
+        story = story_for(client_id)
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            pacer.wait()
+            prompt = f"Test prompt {i}: Tell me something interesting about the number {i}."
+            waited = rate_scheduler.thread_wait()
+            t0 = time.perf_counter()
+            response = infer(prompt)
+            t1 = time.perf_counter()
+            waited = rate_scheduler.thread_wait() - waited
+            if response is None:
+                response = "No response"
+                with results_lock:
+                    errors[0] += 1
+            log_message = f"Prompt: {prompt}\nResponse: {response}"
+            if writer is not None:
+                writer.submit(args.chronicle, story, log_message)
+            elif session is not None:
+                session.log_event(args.chronicle, story, log_message)
+            t2 = time.perf_counter()
+            with results_lock:
+                inference.append(t1 - t0 - waited)
+                scheduling.append(waited)
+                logging.append(t2 - t1)
+                total.append(t2 - t0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for f in [pool.submit(client_loop, c) for c in range(args.clients)]:
+            f.result()
+    drain_start = time.perf_counter()
+    if writer is not None:
+        writer.flush()
+    end = time.perf_counter()
+
+    elapsed = end - start
+    return {
+        "provider": args.provider,
+        "model": args.model,
+        "clients": args.clients,
+        "target_rate": args.rate,
+        "story_mode": args.story_mode,
+        "log_mode": args.log_mode,
+        "requests": len(total),
+        "errors": errors[0],
+        "elapsed_s": elapsed,
+        "drain_s": end - drain_start,
+        "throughput_rps": len(total) / elapsed if elapsed else 0.0,
+        "scheduler": args.scheduler,
+        "inference_s": summarize_latencies(inference),
+        "scheduler_wait_s": summarize_latencies(scheduling),
+        "logging_s": summarize_latencies(logging),
+        "total_s": summarize_latencies(total),
+        "phases": get_metrics().snapshot(),
+    }
+
+
+def print_report(report):
+    print("\n--- Load Generation Results ---")
+    print(f"Provider: {report['provider']} ({report['model']}), clients: {report['clients']}, "
+          f"target rate: {report['target_rate'] or 'unlimited'} req/s")
+    print(f"Story mode: {report['story_mode']}, logging: {report['log_mode']}")
+    print(f"Completed {report['requests']} requests ({report['errors']} errors) "
+          f"in {report['elapsed_s']:.2f}s, drain {report['drain_s']:.3f}s")
+    print(f"Throughput: {report['throughput_rps']:.2f} req/s")
+    phases = ("inference_s", "scheduler_wait_s", "logging_s", "total_s") if report["scheduler"] \
+        else ("inference_s", "logging_s", "total_s")
+    for phase in phases:
+        s = report[phase]
+        print(f"  {phase[:-2]:<14} p50={s['p50'] * 1000:9.2f}ms  p95={s['p95'] * 1000:9.2f}ms  "
+              f"p99={s['p99'] * 1000:9.2f}ms  mean={s['mean'] * 1000:9.2f}ms")
+    print("\n--- Per-phase breakdown ---")
+    print(get_metrics().format_summary())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Concurrent load generator for LLM inference with ChronoLog logging"
+    )
+    parser.add_argument("--provider", choices=["ollama", "openai"], default="ollama")
+    parser.add_argument("--model", default=None, help="Model name (default depends on provider)")
+    parser.add_argument("--url", default=None,
+                        help="Server base URL (default: Ollama on localhost, OpenAI API)")
+    parser.add_argument("--mock", action="store_true",
+                        help="Start an in-process mock LLM server and send requests to it")
+    parser.add_argument("--mock-latency", type=float, default=0.05,
+                        help="Mean response delay of the mock server in seconds")
+    parser.add_argument("-c", "--clients", type=int, default=4, help="Number of concurrent clients")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="Total number of requests")
+    parser.add_argument("-r", "--rate", type=float, default=0.0,
+                        help="Target aggregate request rate in req/s (0 = as fast as possible)")
+    parser.add_argument("--story-mode", choices=["shared", "per-client"], default="shared",
+                        help="Log every client to one story or give each client its own")
+    parser.add_argument("--log-mode", choices=["sync", "async", "none"], default="sync",
+                        help="Log inline, through the background writer, or not at all")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="Answer repeated prompts from the prompt/response cache")
+    parser.add_argument("--scheduler", action="store_true",
+                        help="Pace requests with the adaptive scheduler; its queueing is reported as "
+                             "scheduler wait, not inference")
+    parser.add_argument("--chronicle", default="load_chronicle")
+    parser.add_argument("--story", default="load_story")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+    if args.model is None:
+        args.model = "llama3.2" if args.provider == "ollama" else "gpt-3.5-turbo"
+    return args
+
+
+def main():
+    args = parse_args()
+    # The load is paced by --rate and --clients; the scheduler would cap it
+    rate_scheduler.set_enabled(args.scheduler)
+    server = None
+    if args.mock:
+        server, args.url = start_mock_server(latency=args.mock_latency)
+        print(f"Started mock LLM server at {args.url}")
+    elif args.url is None and args.provider == "ollama":
+        args.url = "http://localhost:11434"
+
+    try:
+        report = run_load(args)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import atexit
+import queue
+import threading
+from chronolog_session import get_session
+from wal_spool import ENABLED as SPOOL_ENABLED, SpoolWriter
+
+# Defaults for the background writer
+MAX_QUEUE = 10000
+BATCH_SIZE = 256
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """
+    Moves ChronoLog writes off the request path.
+
+    `submit` puts an event on a bounded queue and returns immediately; a
+    worker thread drains the queue in batches and writes each event through
+    the ChronoLog session. When the queue is full `submit` blocks (or raises
+    `queue.Full` after `timeout`), which keeps a slow keeper from growing the
+    backlog without bound.
+    """
+
+    def __init__(self, session=None, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE):
+        self._session = session if session is not None else get_session()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._closed = False
+        self.written = 0
+        self.failed = 0
+        self._worker = threading.Thread(target=self._run, name="chronolog-writer", daemon=True)
+        self._worker.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def submit(self, chronicle, story, record, timeout=None):
+        """
+        Queue one record for (chronicle, story).
+
+        Raises:
+            RuntimeError: If the writer has been closed.
+            queue.Full: If the queue stayed full for `timeout` seconds.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncLogWriter is closed.")
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put((chronicle, story, record), timeout=timeout)
+        except queue.Full:
+            self._done(1)
+            raise
+
+    def flush(self, timeout=None):
+        """
+        Block until every event submitted so far has been handed to ChronoLog.
+
+        Returns:
+            bool: False if `timeout` expired first.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def close(self, timeout=None):
+        """Flush outstanding events and stop the worker thread."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def _done(self, n):
+        with self._idle:
+            self._pending -= n
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            for chronicle, story, record in batch:
+                try:
+                    self._session.log_event(chronicle, story, record)
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Error in AsyncLogWriter writing to {chronicle}/{story}: {e}")
+            self._done(len(batch))
+            if stop:
+                return
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Return the process-wide background writer, creating it on first use: a
+    SpoolWriter, so events survive ChronoLog outages, or a plain
+    AsyncLogWriter when CHRONOAI_SPOOL=0.
+    """
+    global _writer
+    if _writer is None or _writer.closed:
+        with _writer_lock:
+            if _writer is None or _writer.closed:
+                _writer = SpoolWriter() if SPOOL_ENABLED else AsyncLogWriter()
+                # Registered after the session's own handler, so it runs first
+                # and drains the queue before the stories are released.
+                atexit.register(_writer.close)
+    return _writer
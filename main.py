@@ -1,8 +1,30 @@
-from chronoai_gpt import gpt_interaction
+import argparse
 
+from chronoai_daemon import DaemonError, connect_daemon
+
+PROMPT = "Explain in detail what is an model context protocol server and how it works"
 
 if __name__ == "__main__":
     #prompt = "Give a sample Database schema code snippet for the CRM Project"
-    reply = gpt_interaction("Explain in detail what is an model context protocol server and how it works")
+    parser = argparse.ArgumentParser(description="Send a prompt to ChatGPT and log the interaction to ChronoLog")
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run in this process even if chronoai_daemon is running"
+    )
+    args = parser.parse_args()
+    daemon = None if args.no_daemon else connect_daemon()
+    in_process = daemon is None
+    if daemon is not None:
+        # A running chronoai_daemon already holds the ChronoLog connection and HTTP pool
+        try:
+            reply = daemon.call("gpt_interaction", prompt=PROMPT)
+        except (DaemonError, OSError) as e:
+            print(f"chronoai_daemon failed ({e}); running in this process instead.")
+            in_process = True
+        finally:
+            daemon.close()
+    if in_process:
+        from chronoai_gpt import gpt_interaction
+        reply = gpt_interaction(PROMPT)
     print(reply)
-
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canned text returned for every prompt
+MOCK_RESPONSE = (
+    "Here is something interesting: every positive integer can be written as "
+    "the sum of at most four squares."
+)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Ollama `/api/generate` and OpenAI
+    `/v1/chat/completions` endpoints, so the benchmarks can run without network.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep the benchmark output readable
+        pass
+
+    def _delay(self):
+        latency, jitter = self.server.latency, self.server.jitter
+        if latency > 0:
+            time.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)))
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self._delay()
+        if self.path == "/api/generate":
+            self._ollama_generate(request)
+        elif self.path == "/v1/chat/completions":
+            self._openai_chat(request)
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def _ollama_generate(self, request):
+        model = request.get("model", "mock")
+        words = MOCK_RESPONSE.split(" ")
+        if not request.get("stream", True):
+            self._send_json({
+                "model": model,
+                "response": MOCK_RESPONSE,
+                "done": True,
+                "prompt_eval_count": len(request.get("prompt", "").split()),
+                "eval_count": len(words),
+            })
+            return
+
+        # NDJSON stream, one token per line, sent with chunked encoding
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            token = word if i == 0 else " " + word
+            self._write_chunk(json.dumps({"model": model, "response": token, "done": False}) + "\n")
+            if self.server.token_delay > 0:
+                time.sleep(self.server.token_delay)
+        self._write_chunk(json.dumps({
+            "model": model,
+            "response": "",
+            "done": True,
+            "prompt_eval_count": len(request.get("prompt", "").split()),
+            "eval_count": len(words),
+        }) + "\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _openai_chat(self, request):
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        self._send_json({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": MOCK_RESPONSE},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": len(MOCK_RESPONSE.split()),
+                "total_tokens": len(prompt.split()) + len(MOCK_RESPONSE.split()),
+            },
+        })
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is expected, not an error
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.05, jitter=0.0, token_delay=0.0):
+    """
+    Start the mock server on a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call `server.shutdown()` to stop it.
+    """
+    server = MockLLMServer((host, port), MockLLMHandler)
+    server.latency = latency
+    server.jitter = jitter
+    server.token_delay = token_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve mock Ollama and OpenAI endpoints for offline benchmarking"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the delay")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Delay between streamed tokens")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(args.host, args.port, args.latency, args.jitter, args.token_delay)
+    print(f"Mock LLM server listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# Extracted page text and summaries by content hash; CHRONOAI_PDF_STORE overrides the path
+PDF_STORE_PATH = os.getenv("CHRONOAI_PDF_STORE", os.path.expanduser("~/.cache/chronoai/pdf_store.sqlite"))
+
+
+def content_hash(data) -> str:
+    """sha256 hex digest of bytes or text."""
+    return hashlib.sha256(data.encode("utf-8") if isinstance(data, str) else data).hexdigest()
+
+
+def merkle_hash(child_hashes: list[str]) -> str:
+    """Hash of a reduce node, from the ordered hashes of what it combines."""
+    return content_hash("\n".join(child_hashes))
+
+
+class PDFStore:
+    """
+    SQLite store behind incremental PDF summarization: extracted page text
+    keyed by a hash of the page's content streams, summaries keyed by the
+    hash of what was summarized (a chunk, or a reduce node's children) and
+    the model, and the page hashes seen for each document on its last run.
+
+    Safe to share between the summarizer's worker threads.
+    """
+
+    def __init__(self, path: str = PDF_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "CREATE TABLE IF NOT EXISTS pages (hash TEXT PRIMARY KEY, text TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " hash TEXT NOT NULL, model TEXT NOT NULL, summary TEXT NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (hash, model)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " path TEXT PRIMARY KEY, page_hashes TEXT NOT NULL, updated REAL NOT NULL);"
+        )
+        self._db.commit()
+
+    def page_text(self, page_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT text FROM pages WHERE hash = ?", (page_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_page(self, page_hash: str, text: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO pages (hash, text) VALUES (?, ?)", (page_hash, text))
+            self._db.commit()
+
+    def summary(self, node_hash: str, model: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary FROM summaries WHERE hash = ? AND model = ?", (node_hash, model)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, node_hash: str, model: str, summary: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (hash, model, summary, created) VALUES (?, ?, ?, ?)",
+                (node_hash, model, summary, time.time()),
+            )
+            self._db.commit()
+
+    def document(self, path: str) -> list[str]:
+        """Page hashes recorded for `path` by the last run, or []."""
+        with self._lock:
+            row = self._db.execute("SELECT page_hashes FROM documents WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def put_document(self, path: str, page_hashes: list[str]):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (path, page_hashes, updated) VALUES (?, ?, ?)",
+                (path, json.dumps(page_hashes), time.time()),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_pdf_store() -> PDFStore:
+    """Return the process-wide PDFStore, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PDFStore()
+    return _store
@@ -1,79 +1,423 @@
 #!/usr/bin/env python3
 import os
 import argparse
-import openai
-from PyPDF2 import PdfReader
+import zlib
+from collections import deque
+from typing import Iterable, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
 from chronoai import ai_interaction
+from chronoai_daemon import DaemonError, connect_daemon
+from llm_cache import cached_completion
+from instrumentation import phase
+from pdf_store import content_hash, get_pdf_store, merkle_hash
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+# Concurrent summarize_text calls in the map and reduce stages
+MAX_WORKERS = 4
+# Approximate tokens sent to one reduce call; keeps prompts inside the context window
+TOKEN_BUDGET = 3000
+# Model for every summary; stored summaries are only reused for the same model
+MODEL = "gpt-3.5-turbo"
+# Words hashed to decide content-defined chunk boundaries
+BOUNDARY_WINDOW = 4
+# A reduce group also ends after about one summary in this many, chosen by hash,
+# so an edit only regroups the summaries next to it
+REDUCE_FANOUT = 4
+
+def _pdf_bytes(obj, depth: int = 0) -> bytes:
     """
-    Read all pages from the PDF and concatenate their text.
+    Serialize a PDF object the same way on every run: indirect references
+    are resolved, dictionaries sorted by key and streams replaced by their
+    decoded data.
+    """
+    if hasattr(obj, "get_object"):
+        obj = obj.get_object()
+    if depth > 16:
+        return b"..."
+    if hasattr(obj, "get_data"):
+        return obj.get_data()
+    if isinstance(obj, dict):
+        return b"<<" + b" ".join(str(key).encode("utf-8") + b" " + _pdf_bytes(value, depth + 1)
+                                 for key, value in sorted(obj.items())) + b">>"
+    if isinstance(obj, list):
+        return b"[" + b" ".join(_pdf_bytes(value, depth + 1) for value in obj) + b"]"
+    return str(obj).encode("utf-8")
+
+def page_hash(page) -> str:
     """
+    Hash of what a page draws: its content streams, the form XObjects they
+    paint and the fonts' encodings. Two pages with the same hash extract to
+    the same text, so an unchanged page is recognized without extracting it.
+    """
+    parts = []
+    contents = page.get_contents()
+    if contents is not None:
+        parts.append(contents.get_data())
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources is not None else {}
+    xobjects = resources.get("/XObject")
+    for name, ref in sorted((xobjects.get_object() if xobjects is not None else {}).items()):
+        xobject = ref.get_object()
+        if xobject.get("/Subtype") == "/Form":
+            parts.append(name.encode("utf-8") + xobject.get_data())
+    fonts = resources.get("/Font")
+    for name, ref in sorted((fonts.get_object() if fonts is not None else {}).items()):
+        font = ref.get_object()
+        # /Encoding is often a reference to a dictionary with /Differences
+        parts.append(f"{name} {font.get('/BaseFont')} ".encode("utf-8") + _pdf_bytes(font.get("/Encoding")))
+        to_unicode = font.get("/ToUnicode")
+        if to_unicode is not None:
+            parts.append(to_unicode.get_object().get_data())
+    return content_hash(b"\0".join(parts))
+
+def iter_pages(pdf_path: str, store=None, stats: Optional[dict] = None) -> Iterator[tuple[int, str]]:
+    """
+    Lazily yield (page_number, text) for each page that has text.
+    Only the current page's text is held in memory.
+
+    With a `store` (a PDFStore), text is looked up by `page_hash` and only
+    pages the store has not seen are extracted. `stats` then collects
+    `page_hashes` (in page order) and the number of pages `extracted`.
+    """
+    # Imported here so the daemon client path does not pay for it
+    from PyPDF2 import PdfReader
     reader = PdfReader(pdf_path)
-    full_text = ""
-    for page in reader.pages:
-        text = page.extract_text()
+    for number, page in enumerate(reader.pages, start=1):
+        if store is None:
+            text = page.extract_text()
+        else:
+            key = page_hash(page)
+            text = store.page_text(key)
+            if text is None:
+                text = page.extract_text() or ""
+                store.put_page(key, text)
+                if stats is not None:
+                    stats["extracted"] = stats.get("extracted", 0) + 1
+            if stats is not None:
+                stats.setdefault("page_hashes", []).append(key)
         if text:
-            full_text += text + "\n"
-    return full_text
+            yield number, text
+
+def iter_chunks(
+    pages: Iterable[tuple[int, str]],
+    max_words: int = 2000,
+    max_chars: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Incrementally pack page text into chunks of up to `max_words` words
+    (and `max_chars` characters, if given). Each chunk is a dict with
+    `index`, `text`, `first_page` and `last_page`.
+    """
+    words: list[str] = []
+    chars = 0
+    first_page = last_page = None
+    index = 0
+    for number, text in pages:
+        for word in text.split():
+            if words and (len(words) >= max_words or (max_chars and chars + len(word) + 1 > max_chars)):
+                index += 1
+                yield {"index": index, "text": " ".join(words), "first_page": first_page, "last_page": last_page}
+                words, chars = [], 0
+            if not words:
+                first_page = number
+            words.append(word)
+            chars += len(word) + 1
+            last_page = number
+    if words:
+        index += 1
+        yield {"index": index, "text": " ".join(words), "first_page": first_page, "last_page": last_page}
+
+def iter_content_chunks(pages: Iterable[tuple[int, str]], max_words: int = 2000) -> Iterator[dict]:
+    """
+    Like `iter_chunks`, but once a chunk has half of `max_words` words it
+    also ends after any word where a hash of the last few words hits a fixed
+    pattern. Boundaries then depend only on the nearby text: an edit changes
+    the chunks around it, and the boundaries after it fall where they did
+    before. Each chunk also carries the `hash` of its text.
+    """
+    min_words = max_words // 2
+    divisor = max(1, max_words // 4)
+    window: deque = deque(maxlen=BOUNDARY_WINDOW)
+    words: list[str] = []
+    first_page = last_page = None
+    index = 0
+
+    def chunk():
+        text = " ".join(words)
+        return {"index": index, "text": text, "first_page": first_page, "last_page": last_page,
+                "hash": content_hash(text)}
+
+    for number, text in pages:
+        for word in text.split():
+            if not words:
+                first_page = number
+            words.append(word)
+            window.append(word)
+            last_page = number
+            if len(words) >= max_words or (
+                    len(words) >= min_words and zlib.crc32(" ".join(window).encode("utf-8")) % divisor == 0):
+                index += 1
+                yield chunk()
+                words = []
+    if words:
+        index += 1
+        yield chunk()
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """
+    Read all pages from the PDF and concatenate their text.
+    """
+    return "".join(text + "\n" for _, text in iter_pages(pdf_path))
 
 def chunk_text(text: str, max_words: int = 2000) -> list[str]:
     """
     Split the input text into chunks of up to `max_words` words each.
     """
-    words = text.split()
-    return [" ".join(words[i : i + max_words]) for i in range(0, len(words), max_words)]
+    return [chunk["text"] for chunk in iter_chunks([(1, text)], max_words)]
 
 def summarize_text(
     text: str,
-    model: str = "gpt-3.5-turbo",
-    temperature: float = 0.3
+    model: str = MODEL,
+    temperature: float = 0.3,
+    stats: Optional[dict] = None,
+    use_cache: bool = True,
 ) -> str:
     """
     Send one chunk of text to the ChatCompletion API and return its summary.
+    Identical requests are answered from the prompt/response cache.
     """
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    resp = openai.ChatCompletion.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that summarizes text."},
-            {"role": "user",   "content": f"Please provide a concise summary of the following text:\n\n{text}"}
-        ],
-        temperature=temperature,
-    )
-    return resp.choices[0].message.content.strip()
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+        {"role": "user",   "content": f"Please provide a concise summary of the following text:\n\n{text}"}
+    ]
+    from llm_client import OPENAI_BASE_URL, get_openai_client
+
+    def call():
+        with phase("openai_completion"):
+            return get_openai_client().complete(model, messages, temperature)
+
+    return cached_completion(model, temperature, messages, call, stats=stats, use_cache=use_cache,
+                             endpoint=OPENAI_BASE_URL.rstrip("/"))
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting (about four characters per token).
+    """
+    return len(text) // 4 + 1
+
+def page_span(chunk: dict) -> str:
+    if chunk["first_page"] == chunk["last_page"]:
+        return f"page {chunk['first_page']}"
+    return f"pages {chunk['first_page']}-{chunk['last_page']}"
+
+def summarize_chunks(
+    chunks: Iterable[dict],
+    max_workers: int = MAX_WORKERS,
+    label: str = "",
+    stage: str = "map",
+    log_chunks: bool = False,
+    store=None,
+) -> list[dict]:
+    """
+    Map stage: summarize chunks concurrently on a bounded worker pool.
+
+    `chunks` may be a lazy iterator (e.g. from `iter_content_chunks`); at
+    most `2 * max_workers` chunks are pulled ahead of the slowest summary,
+    so summarization overlaps extraction without buffering the document.
+    Results keep the input order, page span and `hash`, and each summary is
+    logged through `ai_interaction` as it completes, referencing the chunk's
+    hash (and its children's, for reduce nodes), together with the full
+    chunk text when `log_chunks` is set (large entries are fragmented by the
+    logging layer).
 
-def main(pdf_path: str):
-    # 1) Extract
-    text = extract_text_from_pdf(pdf_path)
-    if not text:
+    With a `store`, chunks whose hash already has a summary are neither
+    summarized nor logged again; results mark them `reused`.
+    """
+    def work(chunk):
+        key = chunk.get("hash") or content_hash(chunk["text"])
+        summary = store.summary(key, MODEL) if store is not None else None
+        reused = summary is not None
+        if not reused:
+            stats: dict = {}
+            summary = summarize_text(chunk["text"], stats=stats)
+            source = "cache" if stats.get("cached") else "llm"
+            print(f" Summarized {stage} chunk {chunk['index']} ({page_span(chunk)}, {source})")
+            if store is not None:
+                store.put_summary(key, MODEL, summary)
+            entry = f"PDF: {label}\nStage: {stage} {chunk['index']} ({page_span(chunk)})\nChunk: {key}\n"
+            if chunk.get("children"):
+                entry += f"Children: {', '.join(chunk['children'])}\n"
+            entry += f"Summary: {summary}\nSource: {source}"
+            if log_chunks:
+                entry += f"\nText: {chunk['text']}"
+            ai_interaction(entry)
+        return {
+            "index": chunk["index"],
+            "text": summary,
+            "first_page": chunk["first_page"],
+            "last_page": chunk["last_page"],
+            "hash": key,
+            "reused": reused,
+        }
+
+    results: list[dict] = []
+    in_flight: deque = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for chunk in chunks:
+            in_flight.append(pool.submit(work, chunk))
+            while len(in_flight) >= 2 * max_workers:
+                results.append(in_flight.popleft().result())
+        while in_flight:
+            results.append(in_flight.popleft().result())
+    return results
+
+def group_by_budget(summaries: list[dict], token_budget: int, fanout: int = REDUCE_FANOUT) -> list[list[dict]]:
+    """
+    Pack consecutive summaries into groups whose combined size fits
+    `token_budget`. Groups hold at least two summaries (when available) so
+    every reduce round shrinks the list.
+
+    A group also ends after a summary whose `hash` is divisible by `fanout`,
+    so where groups start depends on the summaries' content rather than on
+    everything before them, and an edit regroups only its neighbourhood.
+    """
+    groups, current, used = [], [], 0
+    for s in summaries:
+        cost = estimate_tokens(s["text"])
+        if len(current) >= 2 and used + cost > token_budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(s)
+        used += cost
+        if len(current) >= 2 and s.get("hash") and int(s["hash"][:8], 16) % fanout == 0:
+            groups.append(current)
+            current, used = [], 0
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+def reduce_summaries(
+    summaries: list[dict],
+    token_budget: int = TOKEN_BUDGET,
+    max_workers: int = MAX_WORKERS,
+    label: str = "",
+    store=None,
+) -> tuple[str, str, list[str]]:
+    """
+    Hierarchical reduce: while the joined summaries exceed `token_budget`,
+    summarize budget-sized groups of them in parallel, then produce the
+    final summary from what is left.
+
+    Every reduce node is addressed by the Merkle hash of its children's
+    hashes, so with a `store` only the branches above changed chunks are
+    summarized again; an unchanged document needs no LLM call at all.
+
+    Returns:
+        tuple: The final summary, its root hash and the hashes it combines.
+    """
+    level = 1
+    while len(summaries) > 1 and estimate_tokens("\n\n".join(s["text"] for s in summaries)) > token_budget:
+        groups = group_by_budget(summaries, token_budget)
+        print(f"Reducing {len(summaries)} summaries into {len(groups)} groups (level {level})...")
+        summaries = summarize_chunks(
+            (
+                {
+                    "index": i,
+                    "text": "\n\n".join(s["text"] for s in g),
+                    "first_page": g[0]["first_page"],
+                    "last_page": g[-1]["last_page"],
+                    "hash": merkle_hash([s["hash"] for s in g]),
+                    "children": [s["hash"] for s in g],
+                }
+                for i, g in enumerate(groups, start=1)
+            ),
+            max_workers=max_workers,
+            label=label,
+            stage=f"reduce level {level}",
+            store=store,
+        )
+        reused = sum(s["reused"] for s in summaries)
+        if reused:
+            print(f"Reused {reused} of {len(summaries)} level {level} summaries.")
+        level += 1
+
+    children = [s["hash"] for s in summaries]
+    root = merkle_hash(children)
+    final_summary = store.summary(root, MODEL) if store is not None else None
+    if final_summary is None:
+        print("Combining chunk summaries into final summary...")
+        final_summary = summarize_text("\n\n".join(s["text"] for s in summaries), model=MODEL, temperature=0.3)
+        if store is not None:
+            store.put_summary(root, MODEL, final_summary)
+    else:
+        print("Final summary unchanged; reused it.")
+    return final_summary, root, children
+
+def summarize_pdf(pdf_path: str, max_workers: int = MAX_WORKERS, token_budget: int = TOKEN_BUDGET,
+                  log_chunks: bool = False, incremental: bool = True) -> Optional[str]:
+    """
+    Summarize a PDF and log the final summary. Returns None if it has no text.
+
+    With `incremental`, extracted pages and every summary are kept in the
+    PDF store by content hash, so a rerun on an edited document only
+    extracts the changed pages and summarizes the chunks and reduce
+    branches they touch.
+    """
+    # 1) Extract and chunk lazily; 2) summarize chunks as they are produced
+    label = os.path.basename(pdf_path)
+    store = get_pdf_store() if incremental else None
+    stats: dict = {}
+    print(f"Extracting and summarizing text chunks with {max_workers} workers...")
+    chunk_summaries = summarize_chunks(
+        iter_content_chunks(iter_pages(pdf_path, store, stats)),
+        max_workers=max_workers,
+        label=label,
+        log_chunks=log_chunks,
+        store=store,
+    )
+    if store is not None:
+        page_hashes = stats.get("page_hashes", [])
+        path = os.path.abspath(pdf_path)
+        previous = set(store.document(path))
+        store.put_document(path, page_hashes)
+        if previous:
+            changed = sum(h not in previous for h in page_hashes)
+            print(f"{changed} of {len(page_hashes)} pages changed since the last run "
+                  f"({stats.get('extracted', 0)} extracted).")
+        else:
+            print(f"Extracted {stats.get('extracted', 0)} of {len(page_hashes)} pages.")
+    if not chunk_summaries:
         print("No text found in PDF.")
-        return
+        return None
+    reused = sum(s["reused"] for s in chunk_summaries)
+    print(f"Summarized {len(chunk_summaries) - reused} text chunks, reused {reused}.")
+
+    # 3) Reduce: combine and refine within the token budget
+    final_summary, root, children = reduce_summaries(
+        chunk_summaries,
+        token_budget=token_budget,
+        max_workers=max_workers,
+        label=label,
+        store=store,
+    )
 
-    # 2) Chunk
-    chunks = chunk_text(text)
-    print(f"Extracted {len(chunks)} text chunks; summarizing each...")
-
-    # 3) Summarize each chunk
-    chunk_summaries = []
-    for i, chunk in enumerate(chunks, start=1):
-        print(f" Summarizing chunk {i}/{len(chunks)}...")
-        s = summarize_text(chunk)
-        chunk_summaries.append(s)
-
-    # 4) Combine and refine
-    combined = "\n\n".join(chunk_summaries)
-    print("Combining chunk summaries into final summary...")
-    final_summary = summarize_text(
-        combined,
-        model="gpt-3.5-turbo",
-        temperature=0.3
+    ai_interaction(
+        f"PDF: {label}\nStage: final\nChunk: {root}\nChildren: {', '.join(children)}\n"
+        f"Summary: {final_summary}"
     )
+    return final_summary
 
-    # Output
+def print_summary(final_summary: Optional[str]):
+    if final_summary is None:
+        return
     print("\n\n===== Final PDF Summary =====\n")
     print(final_summary)
-    ai_interaction(final_summary)
+
+def main(pdf_path: str, max_workers: int = MAX_WORKERS, token_budget: int = TOKEN_BUDGET,
+         log_chunks: bool = False, incremental: bool = True):
+    print_summary(summarize_pdf(pdf_path, max_workers, token_budget, log_chunks, incremental))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -83,5 +427,52 @@ if __name__ == "__main__":
         "pdf_path",
         help="Path to your PDF file"
     )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="Number of chunks summarized concurrently"
+    )
+    parser.add_argument(
+        "-b", "--token-budget",
+        type=int,
+        default=TOKEN_BUDGET,
+        help="Approximate token budget for each reduce call"
+    )
+    parser.add_argument(
+        "--log-chunks",
+        action="store_true",
+        help="Also log the full source text of every chunk"
+    )
+    parser.add_argument(
+        "--no-store",
+        action="store_true",
+        help="Extract and summarize every page again instead of reusing the PDF store"
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run in this process even if chronoai_daemon is running"
+    )
     args = parser.parse_args()
-    main(args.pdf_path)
+    daemon = None if args.no_daemon else connect_daemon()
+    in_process = daemon is None
+    if daemon is not None:
+        # The daemon prints progress to its own log; only the summary comes back
+        try:
+            print_summary(daemon.call(
+                "summarize_pdf",
+                pdf_path=os.path.abspath(args.pdf_path),
+                max_workers=args.workers,
+                token_budget=args.token_budget,
+                log_chunks=args.log_chunks,
+                incremental=not args.no_store,
+            ))
+        except (DaemonError, OSError) as e:
+            print(f"Summarizing in chronoai_daemon failed ({e}); running in this process instead.")
+            in_process = True
+        finally:
+            daemon.close()
+    if in_process:
+        main(args.pdf_path, max_workers=args.workers, token_budget=args.token_budget,
+             log_chunks=args.log_chunks, incremental=not args.no_store)
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from instrumentation import get_metrics
+
+# Starting point and bounds for each provider's scheduler
+INITIAL_RATE = float(os.getenv("CHRONOAI_RATE", 5.0))        # requests per second
+MIN_RATE = 0.1
+MAX_RATE = float(os.getenv("CHRONOAI_MAX_RATE", 500.0))
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = int(os.getenv("CHRONOAI_MAX_CONCURRENCY", 64))
+# Multiplicative growth per success until the first sign of congestion
+SLOW_START_FACTOR = 1.1
+# After that: +INCREASE_STEP req/s per `rate` successes, i.e. about +1 req/s per second of traffic
+INCREASE_STEP = 1.0
+DECREASE_FACTOR = 0.5
+# Smoothed latency above this multiple of its best value counts as congestion
+LATENCY_FACTOR = 2.0
+LATENCY_ALPHA = 0.2
+# At most one decrease per this many seconds, so a burst of 429s halves once
+DECREASE_COOLDOWN = 1.0
+# Statuses that mean "slow down"
+THROTTLE_STATUSES = {429, 503}
+# CHRONOAI_SCHEDULER=0 turns scheduling off
+ENABLED = os.getenv("CHRONOAI_SCHEDULER", "1") != "0"
+
+_local = threading.local()
+
+
+class AdaptiveScheduler:
+    """
+    Token bucket plus concurrency limit whose rate and limit adapt to the
+    backend (AIMD). Successes grow them, quickly at first and then
+    additively. 429/503 responses and Retry-After halve them and pause new
+    requests until Retry-After expires; latency well above its best
+    smoothed value lowers the concurrency limit one step at a time.
+
+    Callers bracket each request with `acquire()` and `release(started, ...)`.
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, name, rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 concurrency=INITIAL_CONCURRENCY, max_concurrency=MAX_CONCURRENCY):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._slow_start = True
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._latency = None
+        self._best_latency = None
+
+    def _refill(self, now):
+        burst = max(1.0, min(self.rate, float(self.concurrency)))
+        self._tokens = min(burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> float:
+        """
+        Block until the request may start; returns its start time for `release`.
+        """
+        waited = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    timeout = self._paused_until - now
+                elif self._in_flight >= self.concurrency:
+                    timeout = None
+                elif self._tokens < 1.0:
+                    timeout = (1.0 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1.0
+                    self._in_flight += 1
+                    break
+                self._cond.wait(timeout)
+        started = time.monotonic()
+        get_metrics().observe(f"{self.name}_scheduler_wait", started - waited)
+        _local.waited = getattr(_local, "waited", 0.0) + started - waited
+        return started
+
+    def release(self, started: float, status: Optional[int] = None, retry_after=None,
+                latency: Optional[float] = None):
+        """
+        Report how a request went. `status` is its HTTP status, or None if it
+        failed without one; `retry_after` is the Retry-After header, if any.
+        `latency` defaults to the time since `started`; streamed requests,
+        released when their body is closed, pass the time to their headers.
+        """
+        if latency is None:
+            latency = time.monotonic() - started
+        with self._cond:
+            self._in_flight -= 1
+            if status in THROTTLE_STATUSES or retry_after is not None:
+                get_metrics().inc("throttled", provider=self.name)
+                self._decrease(retry_after)
+            elif status is not None and status < 300:
+                self._on_success(latency)
+            self._cond.notify_all()
+
+    def _decrease(self, retry_after=None):
+        now = time.monotonic()
+        if retry_after is not None:
+            try:
+                self._paused_until = max(self._paused_until, now + float(retry_after))
+            except ValueError:
+                pass
+        self._slow_start = False
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+        self.concurrency = max(1, int(self.concurrency * DECREASE_FACTOR))
+        self._tokens = min(self._tokens, 1.0)
+
+    def _on_success(self, latency):
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += LATENCY_ALPHA * (latency - self._latency)
+        if self._best_latency is None or self._latency < self._best_latency:
+            self._best_latency = self._latency
+        if self._latency > LATENCY_FACTOR * self._best_latency:
+            # The backend is queueing requests: run fewer of them at once
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self._last_decrease = now
+                self.concurrency = max(1, self.concurrency - 1)
+            return
+
+        if self._slow_start:
+            self.rate = min(self.max_rate, self.rate * SLOW_START_FACTOR)
+        else:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP / max(self.rate, 1.0))
+        self._successes += 1
+        if self._successes >= self.concurrency:
+            self._successes = 0
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "latency": self._latency,
+                "slow_start": self._slow_start,
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def thread_wait() -> float:
+    """Total seconds the calling thread has spent waiting in `acquire`."""
+    return getattr(_local, "waited", 0.0)
+
+
+def set_enabled(enabled: bool):
+    """Turn scheduling on or off for requests started from now on."""
+    global ENABLED
+    ENABLED = enabled
+
+
+def get_scheduler(provider: str) -> Optional[AdaptiveScheduler]:
+    """
+    Return the process-wide scheduler for `provider` ("ollama", "openai"),
+    or None when scheduling is turned off.
+    """
+    if not ENABLED:
+        return None
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.setdefault(provider, AdaptiveScheduler(provider))
+    return scheduler
@@ -0,0 +1,248 @@
+import base64
+import hashlib
+import heapq
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Sequence
+
+# Records per page, and pages each story may be read ahead of the merge
+PAGE_SIZE = 500
+PREFETCH_PAGES = 2
+# Records each story's stream is re-sorted over before it reaches the merge
+REORDER_WINDOW = 4096
+
+NS_PER_SECOND = 1_000_000_000
+
+Record = namedtuple("Record", ["timestamp", "client_id", "index", "record", "chronicle", "story"])
+Page = namedtuple("Page", ["records", "cursor"])
+
+_DONE = object()
+_RELATIVE = re.compile(r"^(\d+)\s*(s|m|h|d|w)$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def merge_key(record: Record) -> tuple:
+    """Global order of merged records; ties between stories break on their names."""
+    return record.timestamp, record.client_id, record.index, record.chronicle, record.story
+
+
+# --- Cursors ---
+
+def _sources_digest(sources) -> str:
+    text = json.dumps([list(source) for source in sources])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def make_cursor(sources: Sequence[tuple[str, str]], record: Record) -> str:
+    """Opaque token that resumes the same query right after `record`."""
+    body = json.dumps({"k": list(merge_key(record)), "s": _sources_digest(sources)})
+    return base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def parse_cursor(sources: Sequence[tuple[str, str]], cursor: str) -> tuple:
+    """
+    Raises:
+        ValueError: If the cursor is malformed or was made for other stories.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        key = tuple(data["k"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"Malformed cursor {cursor!r}") from None
+    if data.get("s") != _sources_digest(sources):
+        raise ValueError("The cursor was made for a different set of chronicle/story pairs.")
+    return key
+
+
+# --- Dates ---
+
+def parse_time(text, end: bool = False, now: Optional[datetime] = None) -> int:
+    """
+    Parse a time given as nanoseconds, an ISO date or date-time (local time
+    unless it has an offset), "now", "today", "yesterday", or an age such as
+    "30m", "2h" or "7d" (that long ago).
+
+    With `end`, a bare date ("2025-04-30", "today", "yesterday") means the
+    last nanosecond of that day rather than its first.
+
+    Raises:
+        ValueError: If `text` is none of these.
+    """
+    text = str(text).strip().lower()
+    if text.isdigit():
+        return int(text)
+    now = now or datetime.now().astimezone()
+    day = None
+    if text == "now":
+        moment = now
+    elif text in ("today", "yesterday"):
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if text == "yesterday":
+            day -= timedelta(days=1)
+    elif _RELATIVE.match(text):
+        amount, unit = _RELATIVE.match(text).groups()
+        moment = now - timedelta(seconds=int(amount) * _UNIT_SECONDS[unit])
+    else:
+        try:
+            moment = datetime.fromisoformat(text.upper())
+        except ValueError:
+            raise ValueError(f"Unrecognized time {text!r}; use nanoseconds, an ISO date, "
+                             f"'today', 'yesterday' or an age like '2h'") from None
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+        if len(text) == 10:
+            day = moment
+    if day is not None:
+        moment = day + timedelta(days=1) if end else day
+        return int(moment.timestamp()) * NS_PER_SECOND - (1 if end else 0)
+    return int(moment.timestamp() * 1_000_000) * 1000
+
+
+# --- Streaming ---
+
+class _Prefetcher:
+    """
+    Reads one story on its own thread, packing records into pages and
+    staying at most `depth` pages ahead of the consumer.
+
+    Records are re-sorted by merge_key over a window of REORDER_WINDOW, so
+    a reader whose output is only roughly ordered (equal timestamps from
+    several clients, overlapping archive chunks) still gives the merge a
+    sorted stream. A record later than that is passed on with a message.
+    """
+
+    def __init__(self, fetch, chronicle, story, start_time, end_time, after, page_size, depth):
+        self._fetch = fetch
+        self._args = (chronicle, story, start_time, end_time)
+        self._after = after
+        self._page_size = page_size
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"fetch-{chronicle}/{story}", daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        chronicle, story = self._args[:2]
+        try:
+            window = []
+            page = []
+            last = None
+            for seq, (ts, client_id, index, record) in enumerate(self._fetch(*self._args)):
+                item = Record(ts, client_id, index, record, chronicle, story)
+                key = merge_key(item)
+                if self._after is not None and key <= self._after:
+                    continue
+                heapq.heappush(window, (key, seq, item))
+                if len(window) <= REORDER_WINDOW:
+                    continue
+                key, _, item = heapq.heappop(window)
+                if last is not None and key < last:
+                    print(f"{chronicle}/{story}: record at {key[0]} is more than {REORDER_WINDOW} "
+                          f"records out of order; it is yielded late.")
+                last = key
+                page.append(item)
+                if len(page) >= self._page_size:
+                    if not self._put(page):
+                        return
+                    page = []
+            while window:
+                page.append(heapq.heappop(window)[2])
+                if len(page) >= self._page_size:
+                    if not self._put(page):
+                        return
+                    page = []
+            if page:
+                self._put(page)
+        except Exception as e:
+            self._put(e)
+        finally:
+            self._put(_DONE)
+
+    def __iter__(self) -> Iterator[Record]:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def iter_records(reader, sources: Sequence[tuple[str, str]], start_time: int = 0,
+                 end_time: Optional[int] = None, page_size: int = PAGE_SIZE,
+                 cursor: Optional[str] = None, prefetch: int = PREFETCH_PAGES) -> Iterator[Page]:
+    """
+    Stream the records of one or more chronicle/story pairs in global
+    timestamp order, a page at a time.
+
+    Every story is fetched on its own thread, a bounded number of pages
+    ahead, and the streams are combined with a heap-based k-way merge, so
+    memory stays proportional to the number of stories times the page size
+    however long they are.
+
+    Args:
+        reader: Anything with `read_story(chronicle, story, start, end)`
+            (ArchiveReader, LocalStoreReader, ...), or a callable with that
+            signature.
+        sources: (chronicle, story) pairs.
+        start_time, end_time: Nanosecond range; end_time None is open-ended.
+        page_size: Records per page.
+        cursor: `Page.cursor` of an earlier call with the same sources;
+            resumes right after that page.
+
+    Yields:
+        Page: `records` (a list of Record) and the `cursor` that resumes
+        after them.
+
+    Raises:
+        ValueError: If `cursor` does not belong to these sources.
+    """
+    fetch = getattr(reader, "read_story", reader)
+    sources = [tuple(source) for source in sources]
+    after = parse_cursor(sources, cursor) if cursor else None
+    if after is not None:
+        # Readers select on the same timestamp that leads merge_key
+        start_time = max(start_time, after[0])
+    streams = [_Prefetcher(fetch, chronicle, story, start_time, end_time, after, page_size, prefetch)
+               for chronicle, story in sources]
+    try:
+        page = []
+        for record in heapq.merge(*streams, key=merge_key):
+            page.append(record)
+            if len(page) >= page_size:
+                yield Page(page, make_cursor(sources, page[-1]))
+                page = []
+        if page:
+            yield Page(page, make_cursor(sources, page[-1]))
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def format_timestamp(ts: int) -> str:
+    """Local ISO time of a nanosecond timestamp, to the microsecond."""
+    return datetime.fromtimestamp(ts / NS_PER_SECOND).isoformat(sep=" ", timespec="microseconds")
+
+
+def timestamped_path(directory: str, prefix: str = "retrieved") -> str:
+    return os.path.join(directory, f"{prefix}_{time.strftime('%Y%m%d-%H%M%S')}.txt")
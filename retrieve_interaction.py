@@ -1,69 +1,326 @@
 #!/usr/bin/env python3
 import argparse
-import subprocess
-import re
+import os
+from chronoai_daemon import DaemonError, connect_daemon
+from interaction_store import STORE_PATH, InteractionStore
+from keyword_index import INDEX_DIR as KEYWORD_DIR, KeywordIndex, parse_query
+from event_codec import decode_event, format_event
+from retrieval import (PAGE_SIZE, format_timestamp, iter_records, make_cursor, parse_cursor, parse_time,
+                       timestamped_path)
+from storage_backend import BACKEND, BACKENDS, LOCAL_DIR, LocalStoreReader
 
-# Path to your reader binary and config file
-READER_BINARY = "/home/ssonar/chronolog/Debug/test_1/build/hdf5_file_reader"
+# Grapher config that names the story files directory
 CONFIG_FILE    = "/home/ssonar/chronolog/Debug/conf/grapher_conf_1.json"
+# Default end of the time range for ChronoLog archives
+END_TIME       = 1746146975184251801
+# Same default as archive_index.INDEX_DIR, which is not imported up front (h5py)
+INDEX_DIR      = os.getenv("CHRONOAI_INDEX_DIR", os.path.expanduser("~/.cache/chronoai/archive_index"))
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        description="Run ChronoLog HDF5 reader and print only the 'record' fields."
+        description="Read archived ChronoLog story chunks and print only the 'record' fields. "
+                    "Several stories are merged in timestamp order."
+    )
+    parser.add_argument(
+        "-c", "--config",
+        help="Grapher config file with story_files_dir",
+        default=CONFIG_FILE,
+        metavar="FILE"
+    )
+    parser.add_argument(
+        "--backend",
+        help="Read from ChronoLog's archive files or from the local store",
+        choices=BACKENDS,
+        default=BACKEND
+    )
+    parser.add_argument(
+        "--local_dir",
+        help="Root directory of the local backend",
+        default=LOCAL_DIR,
+        metavar="DIR"
     )
     parser.add_argument(
         "-C", "--chronicle",
-        help="Chronicle name to pass to -C",
+        help="Chronicle name to read",
+        default="LLM",
         metavar="NAME"
     )
     parser.add_argument(
         "-S", "--story",
-        help="Story name to pass to -S",
+        help="Story name to read",
+        default="conversation",
         metavar="NAME"
     )
+    parser.add_argument(
+        "--source",
+        help="chronicle/story to read; repeat to merge several (overrides -C/-S)",
+        action="append",
+        metavar="CHRONICLE/STORY"
+    )
     parser.add_argument(
         "-st", "--start_time",
-        help="Start timestamp to pass to -st",
-        metavar="TS"
+        help="Start: nanoseconds, ISO date or date-time, 'today', 'yesterday', or an age like '2h'",
+        default="0",
+        metavar="TIME"
     )
     parser.add_argument(
         "-et", "--end_time",
-        help="End timestamp to pass to -et",
-        default="1746146975184251801",
-        metavar="TS"
+        help="End, in the same forms; a bare date includes the whole day "
+             "(default: %d for ChronoLog, no limit for the local backend)" % END_TIME,
+        metavar="TIME"
+    )
+    parser.add_argument(
+        "--index_dir",
+        help="Directory for the per-story time-range index",
+        default=INDEX_DIR,
+        metavar="DIR"
+    )
+    parser.add_argument(
+        "-q", "--query",
+        help='Keyword query, e.g. \'ollama AND "time series" OR chronolog\'',
+        metavar="QUERY"
+    )
+    parser.add_argument(
+        "--keyword_dir",
+        help="Directory for the keyword index",
+        default=KEYWORD_DIR,
+        metavar="DIR"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--store",
+        help="Local store of already retrieved records "
+             "(default: %s, or interactions.sqlite in --local_dir for the local backend)" % STORE_PATH,
+        metavar="FILE"
+    )
+    parser.add_argument(
+        "--no_store",
+        help="Read straight from the archive without the local store",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--evict_days",
+        help="Drop stored records older than this many days before querying",
+        type=float,
+        metavar="DAYS"
+    )
+    parser.add_argument(
+        "--model",
+        help="Only print interactions with this model",
+        metavar="NAME"
+    )
+    parser.add_argument(
+        "--session",
+        help="Only print interactions logged by this session id",
+        metavar="ID"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="Write to this file instead of printing; a directory gets a timestamped file",
+        metavar="PATH"
+    )
+    parser.add_argument(
+        "--limit",
+        help="Stop after this many records and print a cursor to resume from",
+        type=int,
+        metavar="N"
+    )
+    parser.add_argument(
+        "--cursor",
+        help="Resume a query cut short by --limit",
+        metavar="TOKEN"
+    )
+    parser.add_argument(
+        "--page_size",
+        help="Records fetched per page from each story",
+        type=int,
+        default=PAGE_SIZE,
+        metavar="N"
+    )
+    parser.add_argument(
+        "--no_daemon",
+        help="Read in this process even if chronoai_daemon is running",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--compact",
+        help="Compact the local store after the query",
+        action="store_true"
+    )
+    args = parser.parse_args()
+    try:
+        args.start_time = parse_time(args.start_time)
+        args.end_time = parse_time(args.end_time, end=True) if args.end_time is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.query is not None:
+        try:
+            parse_query(args.query)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.end_time is None and args.backend == "chronolog":
+        args.end_time = END_TIME
+    if args.source:
+        args.sources = [source.split("/", 1) for source in args.source]
+        if any(len(source) != 2 for source in args.sources):
+            parser.error("--source takes chronicle/story")
+    else:
+        args.sources = [[args.chronicle, args.story]]
+    if args.cursor is not None:
+        try:
+            parse_cursor(args.sources, args.cursor)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.store is None:
+        args.store = default_store_path(args.backend, args.local_dir)
+    return args
+
+def default_store_path(backend, local_dir=LOCAL_DIR):
+    """Local store for `backend`; records from the two backends are kept apart."""
+    return STORE_PATH if backend == "chronolog" else os.path.join(local_dir, "interactions.sqlite")
+
+def make_reader(args):
+    """Reader with a `read_story` range query for the selected backend."""
+    if args.backend == "local":
+        return LocalStoreReader(args.local_dir)
+    # h5py is only imported when the ChronoLog archive is actually read
+    from archive_reader import story_files_dir_from_config
+    from archive_index import IndexedArchiveReader
+    return IndexedArchiveReader(story_files_dir_from_config(args.config), args.index_dir)
+
+def read_pages(args, reader=None):
+    """
+    Yield pages of Records for the requested stories and time range, merged
+    in timestamp order (see retrieval.iter_records). `reader` defaults to
+    make_reader(args).
+    """
+    reader = reader if reader is not None else make_reader(args)
+    if args.query and args.no_store:
+        raise SystemExit("--query needs the local store; drop --no_store.")
+    if args.no_store:
+        yield from iter_records(reader, args.sources, args.start_time, args.end_time,
+                                args.page_size, args.cursor)
+        return
+
+    store = InteractionStore(args.store)
+    try:
+        if args.evict_days is not None:
+            removed = store.evict_older_than(args.evict_days * 86400)
+            print(f"Evicted {removed} stored records older than {args.evict_days} days.")
+        if args.query:
+            def fetch(chronicle, story, start_time, end_time):
+                return search_records(store, reader, chronicle, story, args.query, start_time,
+                                      end_time, args.keyword_dir)
+        else:
+            def fetch(chronicle, story, start_time, end_time):
+                return store.query(reader, chronicle, story, start_time, end_time)
+        yield from iter_records(fetch, args.sources, args.start_time, args.end_time,
+                                args.page_size, args.cursor)
+        if args.compact:
+            store.compact()
+    finally:
+        store.close()
+
+def search_records(store, reader, chronicle, story, query, start_time=0, end_time=None,
+                   keyword_dir=KEYWORD_DIR):
+    """
+    Bring the store and keyword index up to date, then yield the records
+    matching `query` in the requested time range.
+    """
+    store.sync(reader, chronicle, story)
+    index = KeywordIndex(chronicle, story, keyword_dir)
+    watermark = index.watermark
+    index.add(store.records(chronicle, story, watermark + 1 if watermark is not None else 0))
+    yield from store.records_at(chronicle, story, index.search(query, start_time, end_time))
+
+def format_record(record, model=None, session=None, header=False):
+    """
+    Decode and format one Record, or return None when its model or session
+    id does not match the given filters. `header` prefixes its story and time.
+    """
+    event = decode_event(record.record)
+    if model is not None and event.get("model") != model:
+        return None
+    if session is not None and event.get("session_id") != session:
+        return None
+    text = format_event(event)
+    if header:
+        text = f"--- {record.chronicle}/{record.story} @ {format_timestamp(record.timestamp)}\n{text}"
+    return text
 
-def build_command(args):
-    cmd = [
-        "stdbuf", "-o0",
-        READER_BINARY,
-        "-c", CONFIG_FILE
-    ]
-    if args.chronicle:
-        cmd += ["-C", args.chronicle]
-    if args.story:
-        cmd += ["-S", args.story]
-    if args.start_time:
-        cmd += ["-st", args.start_time]
-    # always include end time (uses default if none provided)
-    cmd += ["-et", args.end_time]
-    return cmd
+def retrieve(args, reader=None):
+    """
+    Yield the formatted output of the query in `args`. When --limit cuts it
+    short, the last line carries the cursor to resume from.
+    """
+    header = len(args.sources) > 1
+    count = 0
+    pages = read_pages(args, reader)
+    try:
+        for page in pages:
+            for record in page.records:
+                text = format_record(record, args.model, args.session, header)
+                if text is None:
+                    continue
+                yield text
+                count += 1
+                if args.limit and count >= args.limit:
+                    yield f"# Next cursor: {make_cursor(args.sources, record)}"
+                    return
+    finally:
+        pages.close()
 
-def run_and_print_records(cmd):
-    # capture stdout
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    output = result.stdout
+def write_output(lines, output=None):
+    """
+    Print `lines`, or write them to `output` (a directory gets a timestamped
+    file) and return the file's path.
+    """
+    if output is None:
+        for text in lines:
+            print(text)
+        return None
+    if os.path.isdir(output) or output.endswith(os.sep):
+        os.makedirs(output, exist_ok=True)
+        output = timestamped_path(output)
+    count = 0
+    with open(output, "w") as f:
+        for text in lines:
+            f.write(text + "\n")
+            count += 1
+    print(f"Wrote {count} entries to {output}")
+    return output
 
-    # extract record="…"
-    records = re.findall(r'record="([^"]*)"', output)
-    for record in records:
-        print(record)
+def retrieve_via_daemon(daemon, args):
+    """
+    Like `retrieve`, but run in the daemon. If the daemon fails before the
+    first entry arrives, the query runs in this process instead; after that,
+    it stops with a message rather than repeat entries.
+    """
+    emitted = 0
+    try:
+        for text in daemon.stream("retrieve", args=vars(args)):
+            yield text
+            emitted += 1
+    except (DaemonError, OSError) as e:
+        if emitted:
+            print(f"chronoai_daemon failed after {emitted} entries ({e}); rerun with --no_daemon.")
+            return
+        print(f"chronoai_daemon failed ({e}); reading in this process instead.")
+        yield from retrieve(args)
 
 def main():
     args = parse_args()
-    cmd = build_command(args)
-    run_and_print_records(cmd)
+    daemon = None if args.no_daemon else connect_daemon()
+    if daemon is None:
+        write_output(retrieve(args), args.output)
+        return
+    # The daemon keeps readers and indexes loaded; give it absolute paths
+    for name in ("config", "local_dir", "index_dir", "keyword_dir", "store"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    try:
+        write_output(retrieve_via_daemon(daemon, args), args.output)
+    finally:
+        daemon.close()
 
 if __name__ == "__main__":
     main()
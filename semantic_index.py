@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import zlib
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from interaction_store import InteractionStore
+from retrieve_interaction import CONFIG_FILE, INDEX_DIR as ARCHIVE_INDEX_DIR, default_store_path, make_reader
+from storage_backend import BACKEND, BACKENDS, LOCAL_DIR
+from event_codec import event_text
+
+# Where indexes live; CHRONOAI_SEMANTIC_DIR overrides it
+INDEX_DIR = os.getenv("CHRONOAI_SEMANTIC_DIR", os.path.expanduser("~/.cache/chronoai/semantic"))
+DIM = 1024
+# Rows scored per matrix product during search
+SEARCH_BLOCK_ROWS = 65536
+# Records embedded and appended per batch while building
+ADD_BATCH = 1024
+PREVIEW_CHARS = 200
+
+_WORD = re.compile(r"\w+")
+
+
+def _features(text: str) -> list[str]:
+    words = _WORD.findall(text.lower())
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def hashed_ngram_embedding(texts: list[str], dim: int = DIM) -> np.ndarray:
+    """
+    Offline embedding: words and character trigrams hashed into `dim`
+    signed buckets, log-scaled and L2-normalized. Returns a float32 matrix
+    with one row per text.
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            out[row, h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    out = np.sign(out) * np.log1p(np.abs(out))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (out / norms).astype(np.float32, copy=False)
+
+
+class SemanticIndex:
+    """
+    Append-only embedding index stored as a contiguous float32 matrix
+    (`<name>.f32`) plus one JSON metadata line per row (`<name>.meta.jsonl`).
+    The matrix is memory-mapped for search, and new records are appended
+    without rebuilding. `<name>.state.json` remembers the newest timestamp
+    indexed per chronicle/story so builds are incremental.
+    """
+
+    def __init__(self, name: str = "interactions", index_dir: str = INDEX_DIR, dim: int = DIM,
+                 embed: Callable[[list[str], int], np.ndarray] = hashed_ngram_embedding):
+        os.makedirs(index_dir, exist_ok=True)
+        base = os.path.join(index_dir, name)
+        self.matrix_path = base + ".f32"
+        self.meta_path = base + ".meta.jsonl"
+        self.state_path = base + ".state.json"
+        self.dim = dim
+        self.embed = embed
+        self.state = {"dim": dim, "watermarks": {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+            if self.state.get("dim") != dim:
+                raise ValueError(f"Index {base} was built with dim={self.state.get('dim')}, not {dim}")
+        self.meta = []
+        lines = 0
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        self.meta.append(json.loads(line))
+                    except ValueError:
+                        # Torn last line from a crash mid-append
+                        break
+        # A crash between the two appends leaves them uneven; keep the common prefix
+        matrix_rows = os.path.getsize(self.matrix_path) // (4 * dim) if os.path.exists(self.matrix_path) else 0
+        self.rows = min(matrix_rows, len(self.meta))
+        del self.meta[self.rows:]
+        if lines != self.rows:
+            # _append only appends to the metadata file, so it must hold exactly `rows` lines
+            self._rewrite_meta()
+        self._matrix = None
+
+    def __len__(self):
+        return self.rows
+
+    def _rewrite_meta(self):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in self.meta)
+        os.replace(tmp, self.meta_path)
+
+    def watermark(self, chronicle: str, story: str) -> Optional[int]:
+        return self.state["watermarks"].get(f"{chronicle}/{story}")
+
+    def add(self, chronicle: str, story: str, records: Iterable[tuple[int, int, int, bytes]]) -> int:
+        """
+        Embed and append (timestamp, client_id, index, record) tuples.
+
+        Returns:
+            int: Number of rows added.
+        """
+        added = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= ADD_BATCH:
+                added += self._append(chronicle, story, batch)
+                batch = []
+        if batch:
+            added += self._append(chronicle, story, batch)
+        return added
+
+    def _append(self, chronicle, story, batch):
+        texts = [r[3] if isinstance(r[3], str) else event_text(r[3]) for r in batch]
+        vectors = np.ascontiguousarray(self.embed(texts, self.dim), dtype=np.float32)
+        with open(self.matrix_path, "r+b" if os.path.exists(self.matrix_path) else "wb") as f:
+            f.seek(self.rows * 4 * self.dim)
+            f.write(vectors.tobytes())
+            f.truncate()
+        entries = [
+            {
+                "chronicle": chronicle,
+                "story": story,
+                "timestamp": ts,
+                "client_id": client_id,
+                "index": index,
+                "preview": text[:PREVIEW_CHARS],
+            }
+            for (ts, client_id, index, _), text in zip(batch, texts)
+        ]
+        with open(self.meta_path, "a") as f:
+            f.writelines(json.dumps(e) + "\n" for e in entries)
+        self.meta.extend(entries)
+        self.rows += len(batch)
+        self._matrix = None
+
+        key = f"{chronicle}/{story}"
+        newest = max(r[0] for r in batch)
+        self.state["watermarks"][key] = max(newest, self.state["watermarks"].get(key, newest))
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+        return len(batch)
+
+    def matrix(self) -> np.ndarray:
+        """The (rows, dim) float32 matrix, memory-mapped read-only."""
+        if self._matrix is None:
+            if self.rows == 0:
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r",
+                                         shape=(self.rows, self.dim))
+        return self._matrix
+
+    def search(self, queries, k: int = 10, block_rows: int = SEARCH_BLOCK_ROWS) -> list[list[tuple[float, dict]]]:
+        """
+        Top-k cosine matches for one query string or a list of them.
+
+        Rows are scored block by block with one matrix product per block, so
+        memory stays bounded by `block_rows` regardless of index size.
+
+        Returns:
+            list: For each query, up to k (score, metadata) pairs, best first.
+
+        Raises:
+            ValueError: If k is less than 1.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, not {k}")
+        if isinstance(queries, str):
+            queries = [queries]
+        q = self.embed(list(queries), self.dim)  # (nq, dim), rows are unit length
+        matrix = self.matrix()
+        nq = q.shape[0]
+        best_scores = np.full((nq, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((nq, 0), dtype=np.int64)
+
+        for start in range(0, matrix.shape[0], block_rows):
+            block = np.asarray(matrix[start:start + block_rows])
+            scores = q @ block.T  # (nq, block)
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            cand_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            cand_rows = np.concatenate([best_rows, top + start], axis=1)
+            keep = min(k, cand_scores.shape[1])
+            sel = np.argpartition(-cand_scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(cand_scores, sel, axis=1)
+            best_rows = np.take_along_axis(cand_rows, sel, axis=1)
+
+        results = []
+        for qi in range(nq):
+            order = np.argsort(-best_scores[qi])
+            results.append([(float(best_scores[qi, j]), self.meta[int(best_rows[qi, j])]) for j in order])
+        return results
+
+
+def build(index: SemanticIndex, store, reader, chronicle: str, story: str,
+          end_time: Optional[int] = None) -> int:
+    """
+    Append every record of chronicle/story newer than the index watermark.
+    """
+    watermark = index.watermark(chronicle, story)
+    start = watermark + 1 if watermark is not None else 0
+    return index.add(chronicle, story, store.query(reader, chronicle, story, start, end_time))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Build or query a semantic index over logged interactions."
+    )
+    parser.add_argument("--index_dir", default=INDEX_DIR, metavar="DIR")
+    parser.add_argument("--name", default="interactions", help="Index name")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("build", help="Index new records from a chronicle/story")
+    b.add_argument("-c", "--config", default=CONFIG_FILE, help="Grapher config file with story_files_dir")
+    b.add_argument("--backend", choices=BACKENDS, default=BACKEND,
+                   help="Read from ChronoLog's archive files or from the local store")
+    b.add_argument("--local_dir", default=LOCAL_DIR, metavar="DIR", help="Root directory of the local backend")
+    b.add_argument("--archive_index_dir", default=ARCHIVE_INDEX_DIR, metavar="DIR",
+                   help="Directory for the per-story time-range index of ChronoLog archives")
+    b.add_argument("--store", metavar="FILE",
+                   help="Local store of retrieved records (default: the one retrieve_interaction.py "
+                        "uses for the backend)")
+    b.add_argument("-C", "--chronicle", required=True, metavar="NAME")
+    b.add_argument("-S", "--story", required=True, metavar="NAME")
+
+    q = sub.add_parser("query", help="Find the records most similar to a text")
+    q.add_argument("text", nargs="+", help="Query text (several queries are searched in one batch)")
+    q.add_argument("-k", type=int, default=5, help="Results per query")
+    args = parser.parse_args()
+    if args.command == "query" and args.k < 1:
+        parser.error("-k must be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    index = SemanticIndex(args.name, args.index_dir)
+    if args.command == "build":
+        reader = make_reader(argparse.Namespace(backend=args.backend, local_dir=args.local_dir,
+                                                config=args.config, index_dir=args.archive_index_dir))
+        store = InteractionStore(args.store or default_store_path(args.backend, args.local_dir))
+        added = build(index, store, reader, args.chronicle, args.story)
+        print(f"Indexed {added} new records ({len(index)} total).")
+        return
+
+    for text, hits in zip(args.text, index.search(args.text, k=args.k)):
+        print(f"\n=== {text}")
+        for score, meta in hits:
+            print(f"{score:.3f}  {meta['chronicle']}/{meta['story']} @ {meta['timestamp']}: "
+                  f"{meta['preview']!r}")
+
+
+if __name__ == "__main__":
+    main()
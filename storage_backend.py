@@ -0,0 +1,287 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from event_fragments import reassemble
+from wal_spool import unwrap_spooled
+
+# "chronolog" talks to ChronoVisor through py_chronolog_client; "local" writes
+# segment files on this machine. CHRONOAI_BACKEND selects the default.
+BACKEND = os.getenv("CHRONOAI_BACKEND", "chronolog")
+BACKENDS = ("chronolog", "local")
+# Root of the local store; CHRONOAI_LOCAL_DIR overrides it
+LOCAL_DIR = os.getenv("CHRONOAI_LOCAL_DIR", os.path.expanduser("~/.cache/chronoai/local_store"))
+# Size new segment files are preallocated to (larger events get their own)
+SEGMENT_BYTES = 64 << 20
+
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_MAGIC = b"CAIS"
+SEGMENT_VERSION = 1
+# magic, version, tail offset, last timestamp, sealed flag
+_SEGMENT_HEADER = struct.Struct("<4sIQQI4x")
+# timestamp, client id, index, payload length
+_RECORD_HEADER = struct.Struct("<QIII")
+
+
+def client_api(backend: str = BACKEND):
+    """
+    Return the (ClientPortalServiceConf, Client) pair for `backend`. Both
+    follow the py_chronolog_client API: Connect, CreateChronicle,
+    AcquireStory -> (ret, story), ReleaseStory, Disconnect, and
+    story.log_event(record).
+    """
+    if backend == "chronolog":
+        import py_chronolog_client
+        return py_chronolog_client.ClientPortalServiceConf, py_chronolog_client.Client
+    if backend == "local":
+        return LocalPortalConf, LocalClient
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of {BACKENDS}")
+
+
+class _Segment:
+    """One memory-mapped segment file: a header followed by packed records."""
+
+    def __init__(self, path: str, size: int = 0, last_ts: int = 0, writable: bool = True):
+        self.path = path
+        flags = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+        fd = os.open(path, flags, 0o644)
+        try:
+            if writable and os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.size = os.fstat(fd).st_size
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self.mm = mmap.mmap(fd, self.size, access=access)
+        finally:
+            os.close(fd)
+        if writable and self.mm[:4] != SEGMENT_MAGIC:
+            self.mm[:_SEGMENT_HEADER.size] = _SEGMENT_HEADER.pack(
+                SEGMENT_MAGIC, SEGMENT_VERSION, _SEGMENT_HEADER.size, last_ts, 0)
+        elif self.mm[:4] != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+
+    def header(self) -> tuple[int, int, bool]:
+        """(tail offset, last timestamp, sealed) as currently committed."""
+        _, _, tail, last_ts, sealed = _SEGMENT_HEADER.unpack_from(self.mm, 0)
+        return tail, last_ts, bool(sealed)
+
+    def commit(self, tail: int, last_ts: int, sealed: bool = False):
+        _SEGMENT_HEADER.pack_into(self.mm, 0, SEGMENT_MAGIC, SEGMENT_VERSION, tail, last_ts, int(sealed))
+
+    def append(self, tail: int, ts: int, client_id: int, index: int, data: bytes) -> int:
+        """Write one record at `tail` and return the new tail (not committed yet)."""
+        _RECORD_HEADER.pack_into(self.mm, tail, ts, client_id, index, len(data))
+        start = tail + _RECORD_HEADER.size
+        self.mm[start:start + len(data)] = data
+        return start + len(data)
+
+    def records(self) -> Iterator[tuple[int, int, int, bytes]]:
+        tail, _, _ = self.header()
+        pos = _SEGMENT_HEADER.size
+        while pos < tail:
+            ts, client_id, index, length = _RECORD_HEADER.unpack_from(self.mm, pos)
+            pos += _RECORD_HEADER.size
+            yield ts, client_id, index, self.mm[pos:pos + length]
+            pos += length
+
+    def close(self):
+        self.mm.close()
+
+
+def _segment_files(story_dir: str) -> list[tuple[int, str]]:
+    """Segments of one story as (first timestamp, path), oldest first."""
+    if not os.path.isdir(story_dir):
+        return []
+    files = []
+    for name in os.listdir(story_dir):
+        if name.endswith(SEGMENT_SUFFIX):
+            files.append((int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(story_dir, name)))
+    files.sort()
+    return files
+
+
+class LocalStory:
+    """
+    Append-only story in `<root>/<chronicle>/<story>/`. Events go into the
+    newest memory-mapped segment, named after its first timestamp, and
+    timestamps strictly increase within the story. An flock on the story's
+    lock file serializes writers across processes, so several clients can
+    share a story.
+    """
+
+    def __init__(self, root: str, chronicle: str, story: str, client_id: int):
+        self.dir = os.path.join(root, chronicle, story)
+        os.makedirs(self.dir, exist_ok=True)
+        self.client_id = client_id
+        self._index = 0
+        self._segment = None
+        self._thread_lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(self.dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _current_segment(self) -> Optional[_Segment]:
+        """The newest segment, reopened if another writer has sealed ours."""
+        if self._segment is not None and not self._segment.header()[2]:
+            return self._segment
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        files = _segment_files(self.dir)
+        if files:
+            # A crash can leave a newest segment too short to map; size it up
+            self._segment = _Segment(files[-1][1], _SEGMENT_HEADER.size)
+        return self._segment
+
+    def log_event(self, record) -> int:
+        """
+        Append one record and return its timestamp (nanoseconds).
+        """
+        data = record.encode("utf-8") if isinstance(record, str) else bytes(record)
+        need = _RECORD_HEADER.size + len(data)
+        with self._locked():
+            segment = self._current_segment()
+            tail, last_ts, _ = segment.header() if segment is not None else (0, 0, False)
+            ts = max(time.time_ns(), last_ts + 1)
+            if segment is None or tail + need > segment.size:
+                if segment is not None:
+                    segment.commit(tail, last_ts, sealed=True)
+                    segment.close()
+                size = max(SEGMENT_BYTES, _SEGMENT_HEADER.size + need)
+                path = os.path.join(self.dir, f"{ts:020d}{SEGMENT_SUFFIX}")
+                segment = self._segment = _Segment(path, size, last_ts)
+                tail = _SEGMENT_HEADER.size
+            tail = segment.append(tail, ts, self.client_id, self._index, data)
+            segment.commit(tail, ts)
+            self._index += 1
+        return ts
+
+    def flush(self):
+        with self._thread_lock:
+            if self._segment is not None:
+                self._segment.mm.flush()
+
+    def close(self):
+        with self._thread_lock:
+            if self._segment is not None:
+                self._segment.mm.flush()
+                self._segment.close()
+                self._segment = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+
+class LocalPortalConf:
+    """Stands in for ClientPortalServiceConf; the local backend needs no portal."""
+
+    def __init__(self, protocol=None, host=None, port=None, provider_id=None, root=None):
+        self.root = root or LOCAL_DIR
+
+
+class LocalClient:
+    """py_chronolog_client.Client look-alike backed by LocalStory segment files."""
+
+    def __init__(self, conf: Optional[LocalPortalConf] = None):
+        self.root = conf.root if conf is not None else LOCAL_DIR
+        self.client_id = os.getpid() & 0xFFFFFFFF
+        self._stories = {}
+        self._connected = False
+
+    def Connect(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._connected = True
+        return 0
+
+    def CreateChronicle(self, chronicle, attrs=None, flags=0):
+        os.makedirs(os.path.join(self.root, chronicle), exist_ok=True)
+        return 0
+
+    def AcquireStory(self, chronicle, story, attrs=None, flags=0):
+        if not self._connected:
+            return -1, None
+        key = (chronicle, story)
+        if key not in self._stories:
+            self._stories[key] = LocalStory(self.root, chronicle, story, self.client_id)
+        return 0, self._stories[key]
+
+    def ReleaseStory(self, chronicle, story):
+        handle = self._stories.pop((chronicle, story), None)
+        if handle is not None:
+            handle.close()
+        return 0
+
+    def Disconnect(self):
+        for key in list(self._stories):
+            self.ReleaseStory(*key)
+        self._connected = False
+        return 0
+
+
+class LocalStoreReader:
+    """
+    Range reads over the local backend, with the same `read_story`
+    interface as ArchiveReader so the store, indexes and retrieval CLI work
+    on either.
+    """
+
+    def __init__(self, root: str = LOCAL_DIR):
+        self.root = root
+
+    def story_files(self, chronicle: str, story: str) -> list[tuple[int, str]]:
+        return _segment_files(os.path.join(self.root, chronicle, story))
+
+    def files_in_range(self, chronicle: str, story: str, start_time: int = 0,
+                       end_time: Optional[int] = None) -> list[str]:
+        """Segments that may hold events in [start_time, end_time]."""
+        files = self.story_files(chronicle, story)
+        selected = []
+        for i, (first_ts, path) in enumerate(files):
+            if end_time is not None and first_ts > end_time:
+                break
+            if i + 1 < len(files) and files[i + 1][0] <= start_time:
+                continue
+            selected.append(path)
+        return selected
+
+    def _scan(self, chronicle, story, start_time, end_time):
+        for path in self.files_in_range(chronicle, story, start_time, end_time):
+            if os.path.getsize(path) < _SEGMENT_HEADER.size:
+                continue
+            segment = _Segment(path, writable=False)
+            try:
+                for ts, client_id, index, record in segment.records():
+                    if ts < start_time:
+                        continue
+                    if end_time is not None and ts > end_time:
+                        return
+                    yield ts, client_id, index, bytes(record)
+            finally:
+                segment.close()
+
+    def read_story(self, chronicle: str, story: str, start_time: int = 0,
+                   end_time: Optional[int] = None, incomplete: Optional[list] = None,
+                   unwrap: bool = True) -> Iterator[tuple[int, int, int, bytes]]:
+        """
+        Yield (timestamp, client_id, index, record) for the story's events
+        within [start_time, end_time], oldest first, with fragmented events
+        reassembled and spooled events unwrapped. `incomplete` and `unwrap`
+        are as for ArchiveReader.read_story.
+        """
+        records = reassemble(
+            self._scan(chronicle, story, start_time, end_time),
+            more=lambda after: self._scan(chronicle, story, after, None),
+            incomplete=incomplete,
+        )
+        yield from unwrap_spooled(records) if unwrap else records
@@ -0,0 +1,451 @@
+import fcntl
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from instrumentation import get_metrics, phase
+
+# Where spools live: one directory per writing process. CHRONOAI_SPOOL_DIR
+# overrides it; CHRONOAI_SPOOL=0 makes get_writer skip the spool.
+SPOOL_DIR = os.getenv("CHRONOAI_SPOOL_DIR", os.path.expanduser("~/.cache/chronoai/spool"))
+ENABLED = os.getenv("CHRONOAI_SPOOL", "1") != "0"
+# A new segment file is started once the current one would exceed this
+SEGMENT_BYTES = 16 << 20
+# Appends are fsync'ed together at most this often (group commit)
+FSYNC_INTERVAL = 0.05
+# Events replayed between cursor updates
+REPLAY_BATCH = 256
+# Wait between replay attempts while ChronoLog is unreachable, doubling up to the max
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+# How long close() waits for the replayer before leaving the rest for the next run
+CLOSE_TIMEOUT = float(os.getenv("CHRONOAI_SPOOL_CLOSE_TIMEOUT", 5.0))
+# Time close() still gives an idle replayer to exit after the timeout
+CLOSE_JOIN_GRACE = 0.5
+# Readers remember this many replayed events to drop duplicates
+DEDUP_WINDOW = 100000
+
+SEGMENT_SUFFIX = ".wal"
+CURSOR_FILE = "cursor.json"
+LOCK_FILE = ".lock"
+
+# body length, crc32 (of the header after it and the body), seq, timestamp,
+# chronicle length, story length, text flag
+_RECORD = struct.Struct("<IIQQHHB")
+
+# Replayed events are wrapped so their origin survives the trip through
+# ChronoLog. Starts with a NUL byte like the other binary events.
+ENVELOPE_MAGIC = b"\x00CAW"
+# spool id, seq, original timestamp (ns), text flag
+_ENVELOPE = struct.Struct("<16sQQB")
+ENVELOPE_SIZE = len(ENVELOPE_MAGIC) + _ENVELOPE.size
+
+
+def _as_bytes(record):
+    return record.encode("utf-8") if isinstance(record, str) else bytes(record)
+
+
+def wrap_spooled(spool_id: bytes, seq: int, timestamp: int, record) -> bytes:
+    """Prefix `record` with its spool id, sequence number and original timestamp."""
+    header = _ENVELOPE.pack(spool_id, seq, timestamp, int(isinstance(record, str)))
+    return ENVELOPE_MAGIC + header + _as_bytes(record)
+
+
+def is_spooled(record) -> bool:
+    return isinstance(record, (bytes, bytearray, memoryview)) and bytes(record[:4]) == ENVELOPE_MAGIC
+
+
+def parse_spooled(record) -> tuple[bytes, int, int, object]:
+    """
+    Split a replayed event into (spool id, seq, original timestamp, record),
+    the timestamp being when it was spooled.
+    """
+    record = bytes(record)
+    spool_id, seq, original_ts, text = _ENVELOPE.unpack_from(record, len(ENVELOPE_MAGIC))
+    body = record[ENVELOPE_SIZE:]
+    return spool_id, seq, original_ts, body.decode("utf-8", errors="replace") if text else body
+
+
+def unwrap_spooled(records: Iterable[tuple[int, int, int, bytes]], window: int = DEDUP_WINDOW
+                   ) -> Iterator[tuple[int, int, int, bytes]]:
+    """
+    Pass (timestamp, client_id, index, record) tuples through, unwrapping
+    replayed events.
+
+    Events keep the ChronoLog timestamp they are stored (and selected) by;
+    the original one stays in the envelope (see `parse_spooled`). An event
+    replayed twice (the replayer stopped between logging it and saving its
+    cursor) is yielded once if both copies are within `window` events of
+    each other; InteractionStore drops duplicates across reads.
+    """
+    seen = OrderedDict()
+    for ts, client_id, index, record in records:
+        if not is_spooled(record):
+            yield ts, client_id, index, record
+            continue
+        spool_id, seq, _, body = parse_spooled(record)
+        key = (spool_id, seq)
+        if key in seen:
+            continue
+        seen[key] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        yield ts, client_id, index, body
+
+
+class WriteAheadSpool:
+    """
+    Append-only event log in one directory: numbered segment files (named
+    after their first sequence number) of CRC-checked records, and a cursor
+    file with the position up to which events have reached ChronoLog.
+
+    The directory's lock file is flocked while a process owns the spool, so
+    spools left behind by a process that died can be told apart from live
+    ones and adopted.
+    """
+
+    def __init__(self, path: str, lock_fd: int, writable: bool):
+        self.path = path
+        self.spool_id = bytes.fromhex(os.path.basename(path))
+        self._lock_fd = lock_fd
+        self._lock = threading.Lock()
+        self._fd = None
+        self._active = None
+        self._tail = 0
+        self._dirty = False
+        self.next_seq = 1
+        self.cursor = self._load_cursor()
+        if writable:
+            self._open_segment(self.next_seq)
+
+    @classmethod
+    def create(cls, root: str = SPOOL_DIR) -> "WriteAheadSpool":
+        """Start a new spool owned by this process."""
+        spool_id = uuid.uuid4().hex
+        # Built and locked under a name adopt_orphans ignores, then moved into place
+        staging = os.path.join(root, f".new-{spool_id}")
+        os.makedirs(staging)
+        lock_fd = os.open(os.path.join(staging, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        path = os.path.join(root, spool_id)
+        os.rename(staging, path)
+        return cls(path, lock_fd, writable=True)
+
+    @classmethod
+    def adopt(cls, path: str) -> Optional["WriteAheadSpool"]:
+        """Take over a spool whose owner has exited; None if it is still in use."""
+        try:
+            lock_fd = os.open(os.path.join(path, LOCK_FILE), os.O_RDWR)
+        except OSError:
+            return None
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(lock_fd)
+            return None
+        return cls(path, lock_fd, writable=False)
+
+    def _load_cursor(self) -> tuple[Optional[str], int]:
+        try:
+            with open(os.path.join(self.path, CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            return cursor["segment"], cursor["offset"]
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def segment_files(self) -> list[tuple[str, str]]:
+        """(name, path) of every segment, oldest first."""
+        names = sorted(n for n in os.listdir(self.path) if n.endswith(SEGMENT_SUFFIX))
+        return [(name, os.path.join(self.path, name)) for name in names]
+
+    def _open_segment(self, first_seq: int):
+        name = f"{first_seq:020d}{SEGMENT_SUFFIX}"
+        self._fd = os.open(os.path.join(self.path, name), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._active = name
+        self._tail = 0
+        # Make the new file name itself durable
+        dir_fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def append(self, chronicle: str, story: str, record) -> int:
+        """
+        Append one event and return its sequence number. The write reaches
+        the OS page cache here; `sync` makes it durable.
+        """
+        chronicle_b, story_b, data = chronicle.encode("utf-8"), story.encode("utf-8"), _as_bytes(record)
+        body = chronicle_b + story_b + data
+        with self._lock:
+            seq = self.next_seq
+            fields = _RECORD.pack(len(body), 0, seq, time.time_ns(), len(chronicle_b), len(story_b),
+                                  int(isinstance(record, str)))
+            crc = zlib.crc32(body, zlib.crc32(fields[8:]))
+            entry = fields[:4] + struct.pack("<I", crc) + fields[8:] + body
+            if self._tail and self._tail + len(entry) > SEGMENT_BYTES:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._open_segment(seq)
+            view = memoryview(entry)
+            while view:
+                view = view[os.write(self._fd, view):]
+            self._tail += len(entry)
+            self._dirty = True
+            self.next_seq = seq + 1
+        return seq
+
+    def sync(self):
+        """fsync everything appended so far; appends continue meanwhile."""
+        with self._lock:
+            if not self._dirty or self._fd is None:
+                return
+            self._dirty = False
+            fd = os.dup(self._fd)
+        try:
+            with phase("spool_fsync"):
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read(self, limit: int) -> Iterator[tuple[tuple[str, int], int, int, str, str, object]]:
+        """
+        Yield up to `limit` events after the cursor as (position, seq,
+        timestamp, chronicle, story, record), where `position` is the cursor
+        value that marks the event as done. A torn record at the end of a
+        segment (the writer crashed mid-append) ends that segment.
+        """
+        with self._lock:
+            active, active_tail = self._active, self._tail
+        start_name, start_offset = self.cursor
+        for name, path in self.segment_files():
+            if start_name is not None and name < start_name:
+                continue
+            offset = start_offset if name == start_name else 0
+            end = active_tail if name == active else None
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while limit > 0 and (end is None or offset < end):
+                    header = f.read(_RECORD.size)
+                    if len(header) < _RECORD.size:
+                        break
+                    length, crc, seq, ts, chronicle_len, story_len, text = _RECORD.unpack(header)
+                    body = f.read(length)
+                    if len(body) < length or zlib.crc32(body, zlib.crc32(header[8:])) != crc:
+                        break
+                    offset += _RECORD.size + length
+                    chronicle = body[:chronicle_len].decode("utf-8")
+                    story = body[chronicle_len:chronicle_len + story_len].decode("utf-8")
+                    data = body[chronicle_len + story_len:]
+                    limit -= 1
+                    yield (name, offset), seq, ts, chronicle, story, data.decode("utf-8") if text else data
+            if limit <= 0 or name == active:
+                return
+
+    def commit(self, position: tuple[str, int]):
+        """Persist the cursor and delete segments that are fully replayed."""
+        self.cursor = position
+        path = os.path.join(self.path, CURSOR_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": position[0], "offset": position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for name, segment_path in self.segment_files():
+            if name >= position[0]:
+                break
+            os.remove(segment_path)
+
+    def close(self, remove: bool = False):
+        """Sync and unlock; `remove` deletes the directory (nothing left to replay)."""
+        self.sync()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        if remove:
+            shutil.rmtree(self.path, ignore_errors=True)
+        os.close(self._lock_fd)
+
+
+def adopt_orphans(root: str = SPOOL_DIR) -> list[WriteAheadSpool]:
+    """Spools under `root` whose owning process is gone, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    orphans = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if len(name) != 32 or not os.path.isdir(path):
+            continue
+        spool = WriteAheadSpool.adopt(path)
+        if spool is not None:
+            orphans.append((os.path.getmtime(path), spool))
+    orphans.sort(key=lambda item: item[0])
+    return [spool for _, spool in orphans]
+
+
+class SpoolWriter:
+    """
+    Background writer that puts every event in a local write-ahead spool
+    before it goes anywhere near ChronoLog.
+
+    `submit` appends to the spool and returns; a worker thread fsyncs new
+    appends every FSYNC_INTERVAL and replays them into ChronoLog in order,
+    each wrapped with its spool id, sequence number and original timestamp
+    (see `unwrap_spooled`). While ChronoLog is unreachable the replayer backs
+    off and events stay in the spool, so a down or slow keeper never blocks
+    the caller; spools left by earlier processes are replayed first.
+
+    Drop-in for AsyncLogWriter: same `submit`, `flush`, `close`, `written`
+    and `failed`.
+    """
+
+    def __init__(self, session=None, root=SPOOL_DIR):
+        if session is None:
+            from chronolog_session import get_session
+            session = get_session()
+        self._session = session
+        self._spool = WriteAheadSpool.create(root)
+        self._orphans = adopt_orphans(root)
+        self._cond = threading.Condition()
+        self._appended = 0
+        self._replayed = 0
+        self._closed = False
+        self._stop = False
+        self._retry_at = 0.0
+        self._backoff = BACKOFF_MIN
+        self._down = False
+        self.written = 0
+        self.failed = 0
+        self._worker = threading.Thread(target=self._run, name="chronolog-spool", daemon=True)
+        self._worker.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def submit(self, chronicle, story, record, timeout=None):
+        """
+        Append one record for (chronicle, story) to the spool. `timeout` is
+        accepted for AsyncLogWriter compatibility; appends do not wait on
+        ChronoLog.
+
+        Raises:
+            RuntimeError: If the writer has been closed.
+        """
+        if self._closed:
+            raise RuntimeError("SpoolWriter is closed.")
+        with phase("spool_append"):
+            seq = self._spool.append(chronicle, story, record)
+        get_metrics().inc("events_spooled")
+        with self._cond:
+            self._appended = max(self._appended, seq)
+
+    def flush(self, timeout=None):
+        """
+        Block until every event submitted so far has been replayed into ChronoLog.
+
+        Returns:
+            bool: False if `timeout` expired first.
+        """
+        with self._cond:
+            self._retry_at = 0.0
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._replayed >= self._appended, timeout=timeout)
+
+    def close(self, timeout=None):
+        """
+        Flush for up to `timeout` seconds (default CLOSE_TIMEOUT) and stop
+        the worker, without waiting on a log_event call that hangs. Events
+        that could not be replayed stay in the spool for the next process.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        deadline = time.monotonic() + (CLOSE_TIMEOUT if timeout is None else timeout)
+        drained = self.flush(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._worker.join(max(CLOSE_JOIN_GRACE, deadline - time.monotonic()))
+        if self._worker.is_alive():
+            # Stuck in log_event on a slow keeper; the spool stays locked
+            # until this process exits, then the next run adopts it
+            self._spool.sync()
+            print(f"ChronoLog did not answer; {self._appended - self._replayed} events left in spool "
+                  f"{self._spool.path} for the next run.")
+            return
+        if not drained:
+            print(f"{self._appended - self._replayed} events left in spool {self._spool.path}; "
+                  f"they will be replayed by the next run.")
+        self._spool.close(remove=drained)
+        for spool in self._orphans:
+            spool.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stop:
+                    self._cond.wait(FSYNC_INTERVAL)
+                stop = self._stop
+            self._spool.sync()
+            if time.monotonic() >= self._retry_at:
+                self._replay()
+            if stop:
+                return
+
+    def _replay(self):
+        for spool in list(self._orphans) + [self._spool]:
+            while True:
+                done, replayed = self._replay_batch(spool)
+                if not done:
+                    return
+                if replayed < REPLAY_BATCH:
+                    break
+            if spool is not self._spool:
+                print(f"Replayed spool {spool.path} left by an earlier run.")
+                self._orphans.remove(spool)
+                spool.close(remove=True)
+
+    def _replay_batch(self, spool):
+        """Replay one batch; returns (completed without error, events replayed)."""
+        position = None
+        last_seq = 0
+        replayed = 0
+        ok = True
+        for position_after, seq, ts, chronicle, story, record in spool.read(REPLAY_BATCH):
+            try:
+                self._session.log_event(chronicle, story, wrap_spooled(spool.spool_id, seq, ts, record))
+            except Exception as e:
+                self.failed += 1
+                get_metrics().inc("errors", phase="spool_replay")
+                if not self._down:
+                    print(f"ChronoLog unavailable ({e}); keeping events in the local spool.")
+                self._down = True
+                self._retry_at = time.monotonic() + self._backoff
+                self._backoff = min(BACKOFF_MAX, self._backoff * 2)
+                ok = False
+                break
+            position, last_seq = position_after, seq
+            replayed += 1
+            self.written += 1
+        if position is not None:
+            spool.commit(position)
+            get_metrics().inc("events_replayed", replayed)
+            if spool is self._spool:
+                with self._cond:
+                    self._replayed = max(self._replayed, last_seq)
+                    self._cond.notify_all()
+        if ok and replayed and self._down:
+            print("ChronoLog reachable again; replaying spooled events.")
+            self._down = False
+            self._backoff = BACKOFF_MIN
+        return ok, replayed